@@ -7,9 +7,15 @@ and similar functions although help(object) will work.
 
 """
 # Initialize the connection to Opticks.
+from timeit import default_timer as _timer
+_IMPORT_START = _timer()
 import _opticks
 import sys
+import os
 import ctypes
+import threading
+import collections
+import re
 
 __copyright__ = """The information in this file is
  Copyright(c) 2009 Ball Aerospace & Technologies Corporation
@@ -27,6 +33,8 @@ class SimpleApiError(OpticksError):
     The 'message' member contains the user readable error message.
     The 'result' member contains the return result from the original
     function call.
+    The 'function' member contains the name of the Simple API function
+    blamed for the error when it is known.
 
     """
 
@@ -40,23 +48,150 @@ class SimpleApiError(OpticksError):
     SIMPLE_WRONG_VIEW_TYPE = 7
     SIMPLE_OTHER_FAILURE = -1
 
-    def __init__(self, code, result=None):
-        OpticksError.__init__(self, code, self._getErrorString(code))
+    def __init__(self, code, result=None, function=None):
+        if function is None:
+            OpticksError.__init__(self, code, self._getErrorString(code))
+        else:
+            OpticksError.__init__(self, code, self._getErrorString(code),
+                                  function)
         self.code = code
         self.message = self._getErrorString(code)
         self.result = result
+        self.function = function
 
-def _simple_error_check(result, func, args):
+_ERROR_STATE = threading.local()
+
+def _strict_error_check(result, func, args):
     """This errcheck function queries the last error state
-    and raises an exception if an error occured
+    and raises an exception if an error occured. It is used by
+    functions whose errors are part of normal control flow so
+    they are checked even inside deferred_errors().
 
     """
     #pylint: disable=W0212,W0613
     err = SimpleApiError._get_last_error()
     if err != SimpleApiError.SIMPLE_NO_ERROR:
-        raise SimpleApiError(err, result)
+        raise SimpleApiError(err, result, getattr(func, '__name__', None))
     return args
 
+def _simple_error_check(result, func, args):
+    """This errcheck function queries the last error state
+    and raises an exception if an error occured. Inside
+    deferred_errors() the check is left to the active scope.
+
+    """
+    deferred = getattr(_ERROR_STATE, 'deferred', None)
+    if deferred is not None and _returns_handle(func) and \
+            not _is_null_result(result, func):
+        deferred.record(func, result)
+        return args
+    return _strict_error_check(result, func, args)
+
+def _returns_handle(func):
+    """Return True if func returns a pointer or handle. Only these calls
+    are deferred since a NULL result shows that the call failed. The
+    failure of any other call would be lost if a later call succeeded
+    before the error state was checked.
+
+    """
+    restype = getattr(func, 'restype', None)
+    if not isinstance(restype, type):
+        return False
+    if restype in (ctypes.c_void_p, ctypes.c_char_p) or \
+            issubclass(restype, ctypes._Pointer):
+        return True
+    return issubclass(restype, ctypes.Structure) and \
+        hasattr(restype, 'handle')
+
+def _is_null_result(result, func):
+    """Return True if result is a NULL pointer or handle returned from
+    a function which returns a pointer or handle. Such a result usually
+    means the call failed so it is checked immediately.
+
+    """
+    restype = getattr(func, 'restype', None)
+    if restype is None:
+        return False
+    if result is None:
+        return True
+    if isinstance(result, ctypes._Pointer):
+        return not result
+    if isinstance(result, ctypes.Structure) and hasattr(result, 'handle'):
+        return not result.handle
+    return False
+
+class _DeferredErrors(object):
+    "Scope object created by deferred_errors()."
+
+    def __init__(self, check_every=None):
+        self.check_every = check_every
+        self.calls = 0
+        self.__last = None
+        self.__failure = None
+        self.__outer = None
+
+    def __enter__(self):
+        self.__outer = getattr(_ERROR_STATE, 'deferred', None)
+        _ERROR_STATE.deferred = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _ERROR_STATE.deferred = self.__outer
+        self.__outer = None
+        if exc_type is None:
+            self.check()
+        return False
+
+    def record(self, func, result):
+        "Note a call whose error check has been deferred."
+        self.calls += 1
+        self.__last = (func, result)
+        if self.check_every and self.calls % self.check_every == 0:
+            self.check()
+
+    def check(self):
+        """Query the error state now. The Simple API error state reflects
+        the most recent call so the error is attributed to the last call
+        recorded by this scope. Once an error has been found it is
+        remembered and raised again by every later check in this scope
+        so a failure is never hidden by calls which succeed after it.
+
+        """
+        #pylint: disable=W0212
+        if self.__failure is not None:
+            raise SimpleApiError(*self.__failure)
+        if self.__last is None:
+            return
+        func, result = self.__last
+        self.__last = None
+        err = SimpleApiError._get_last_error()
+        if err != SimpleApiError.SIMPLE_NO_ERROR:
+            self.__failure = (err, result, getattr(func, '__name__', None))
+            raise SimpleApiError(*self.__failure)
+
+def deferred_errors(check_every=None):
+    """Return a context manager which defers Simple API error checking.
+    Inside the scope wrapped functions do not query the error state after
+    every call which roughly halves the number of calls into Opticks in
+    tight loops. The error state is checked when the scope exits and,
+    if check_every is not None, after every check_every calls. Any error
+    is raised as a SimpleApiError whose 'function' member names the last
+    call made before the check; use a small check_every to narrow down
+    the failing call. Only calls which return a pointer or handle are
+    deferred and those returning NULL are checked immediately so they
+    are blamed correctly and cannot be masked by later calls. Calls
+    returning nothing or a status value are always checked immediately
+    since nothing else records their failure. Functions whose errors are
+    used for normal control flow (lookups, element creation, iteration
+    termination) are also always checked immediately. Scopes apply only
+    to the current thread.
+
+    """
+    return _DeferredErrors(check_every)
+
+
+_BINDINGS = {}
+_BINDING_HOOK = None
 
 try:
     if sys.platform == 'linux2':
@@ -65,32 +200,134 @@ try:
         __API = ctypes.CDLL("SimpleApiLib")
     pyobj = ctypes.py_object(_opticks.handle())
     __API.setHandle(ctypes.pythonapi.PyCObject_AsVoidPtr(pyobj))
-    def _genwrap(name, *args, **kargs):
-        """Create a wrapper function for an API function.
-        First arg is the name of the C function.
-        Second arg is the return type (a ctypes type or None for void).
-        Remaining args are the ctypes types for the function arguments.
-        The 'errorCheck' keyword is a bool indicating if checks should be
-        made for Simple API errors. These errors will be turned into
-        a SimpleApiError exception. The default is to include
-        error checking.
-
-        """
+    def _bind(name, args, error_check, deferrable):
+        "Build the ctypes prototype for an API function and resolve it."
         prototype = apply(ctypes.CFUNCTYPE, args)
         func = prototype((name, __API))
-        error_check = kargs.get('errorCheck', True)
-        if error_check:
+        func.__name__ = name
+        if error_check and deferrable:
             func.errcheck = _simple_error_check
+        elif error_check:
+            func.errcheck = _strict_error_check
         return func
 except EnvironmentError:
     print "ERROR: The SimpleApiLib dynamic library could not be located. "\
           "The opticks module WILL NOT FUNCTION PROPERLY."
-    def _genwrap(name, *args, **kargs):
+    def _bind(name, args, error_check, deferrable):
         #pylint: disable=W0613
         def dummy_placeholder(*args, **kargs):
             raise RuntimeError("Must be run from within Opticks application")
         return dummy_placeholder
 
+class _Binding(object):
+    """A Simple API entry point which is resolved on first use.
+    Bindings are descriptors so they may be stored as class attributes
+    and behave exactly like the ctypes function they wrap. They may also
+    be called directly.
+
+    """
+    __slots__ = ('key', 'raw', 'func')
+
+    def __init__(self, key):
+        self.key, self.raw, self.func = key, None, None
+
+    def resolve(self):
+        "Resolve the C symbol if that has not already been done."
+        if self.func is None:
+            if self.raw is None:
+                self.raw = _bind(*self.key)
+            self.wrap()
+        return self.func
+
+    def wrap(self):
+        "Apply the current binding hook to the resolved function."
+        if _BINDING_HOOK is None:
+            self.func = self.raw
+        else:
+            self.func = _BINDING_HOOK(self.key[0], self.raw)
+
+    def __get__(self, obj, objtype=None):
+        if self.func is None:
+            return self.resolve()
+        return self.func
+
+    def __call__(self, *args):
+        if self.func is None:
+            return self.resolve()(*args)
+        return self.func(*args)
+
+    def __repr__(self):
+        return "<_Binding: %s %s>" % (self.key[0],
+                                      self.func is None and "unresolved" or
+                                      "resolved")
+
+def _genwrap(name, *args, **kargs):
+    """Create a wrapper function for an API function.
+    First arg is the name of the C function.
+    Second arg is the return type (a ctypes type or None for void).
+    Remaining args are the ctypes types for the function arguments.
+    The 'errorCheck' keyword is a bool indicating if checks should be
+    made for Simple API errors. These errors will be turned into
+    a SimpleApiError exception. The default is to include
+    error checking. The 'deferrable' keyword is a bool indicating if
+    error checking may be postponed by deferred_errors(). Pass False
+    when errors from the function are caught as part of normal
+    control flow. The default is True.
+    Wrappers are cached in a process wide registry keyed on the name,
+    signature and error checking so each entry point is only resolved
+    once no matter how many times it is requested. The C symbol is not
+    looked up until the wrapper is first used.
+
+    """
+    key = (name, args, kargs.get('errorCheck', True),
+           kargs.get('deferrable', True))
+    func = _BINDINGS.get(key)
+    if func is None:
+        func = _BINDINGS[key] = _Binding(key)
+    return func
+
+def _set_binding_hook(hook):
+    """Install a function which wraps every binding. The hook is called
+    as hook(name, func) and returns the callable to use in place of func.
+    Pass None to remove the hook. Bindings which have already been
+    resolved are rewrapped immediately.
+
+    """
+    #pylint: disable=W0603
+    global _BINDING_HOOK
+    _BINDING_HOOK = hook
+    for binding in _BINDINGS.values():
+        if binding.raw is not None:
+            binding.wrap()
+
+def resolve_bindings():
+    """Resolve every registered Simple API binding immediately instead
+    of on first use. This is useful to validate the module against the
+    SimpleApiLib in use. Returns a sorted list of the names of any
+    functions which could not be found.
+
+    """
+    missing = []
+    for binding in _BINDINGS.values():
+        try:
+            binding.resolve()
+        except AttributeError:
+            missing.append(binding.key[0])
+    return sorted(missing)
+
+def startup_report():
+    """Return a string describing how long the opticks module took to
+    import and how many Simple API bindings have been resolved.
+
+    """
+    resolved = len([binding for binding in _BINDINGS.values()
+                    if binding.func is not None])
+    report = ("opticks imported in %.1f ms, %i of %i bindings resolved" %
+              (_IMPORT_TIME * 1000.0, resolved, len(_BINDINGS)))
+    if _UNRESOLVED:
+        report += "\nUnresolved functions: %s" % ", ".join(_UNRESOLVED)
+    return report
+
 def version_info():
     """Return a tuple containing (Opticks version, Python PlugIn Version)
     as strings.
@@ -102,27 +339,38 @@ def version_info():
     pver = _opticks.pythonVersion()
     return over, pver
 
+_STRING_SCRATCH = threading.local()
+_STRING_SIZES = {}
+_MIN_STRING_BUFFER = 256
+
 def _stringbuffer_wrap(func, *args, **kargs):
     """This function calls a
     'ctypes.c_uint32 func(ctypes.c_char_p, ctypes.c_uin32)' function and
     returns a python string. Pass in the python function
-    (usually created with '_genwrap()'). The minimal buffer size will
-    be calculated before retrieving the string. The 'defaultBufferSize'
-    keyword allows specification of an initial buffer size. This may
-    result in a single function call instead of two. The default is to
-    always calculate the minimum buffer size. If remaining args are
-    present, they will be passed to 'func' before the buffer argument.
+    (usually created with '_genwrap()'). A per-thread scratch buffer is
+    reused for every call and the largest size seen for each function is
+    remembered so most strings are fetched with a single call. If the
+    buffer is too small it is grown and the function called again.
+    The 'defaultBufferSize' keyword allows specification of a minimum
+    initial buffer size. If remaining args are present, they will be
+    passed to 'func' before the buffer argument.
 
     """
-    default_buffersize = kargs.get('defaultBufferSize', 0)
-    buf = ctypes.create_string_buffer(default_buffersize)
-    tmpargs = args + (buf, ctypes.sizeof(buf))
-    size = apply(func, tmpargs)
+    key = getattr(func, '__name__', func)
+    wanted = max(_STRING_SIZES.get(key, 0),
+                 kargs.get('defaultBufferSize', 0))
+    buf = getattr(_STRING_SCRATCH, 'buf', None)
+    if buf is None or ctypes.sizeof(buf) < wanted:
+        buf = ctypes.create_string_buffer(max(wanted, _MIN_STRING_BUFFER))
+        _STRING_SCRATCH.buf = buf
+    size = apply(func, args + (buf, ctypes.sizeof(buf)))
     if size > ctypes.sizeof(buf):
-        ctypes.resize(buf, size)
-        tmpargs = args + (buf, ctypes.sizeof(buf))
-        apply(func, tmpargs)
-    return ctypes.string_at(buf)
+        buf = ctypes.create_string_buffer(size)
+        _STRING_SCRATCH.buf = buf
+        apply(func, args + (buf, size))
+    if size > _STRING_SIZES.get(key, 0):
+        _STRING_SIZES[key] = size
+    return buf.value
 
 SimpleApiError._get_last_error = \
     _genwrap("getLastError", ctypes.c_int, errorCheck=False)
@@ -131,47 +379,84 @@ SimpleApiError._set_last_error = \
 SimpleApiError._getErrorString = \
     _genwrap("getErrorString", ctypes.c_char_p, ctypes.c_int, errorCheck=False)
 
-def _void_p_to_native(typename, value):
+_TYPES_BY_NAME = {}
+_TYPES_BY_CTYPE = {}
+_TYPES_BY_NUMPY = {}
+_TYPES_BY_ENCODING = {}
+
+class _TypeInfo(object):
+    "A type registry entry. See register_type()."
+    __slots__ = ('name', 'ctype', 'numpy_type', 'encoding')
+
+    def __init__(self, name, ctype, numpy_type, encoding):
+        self.name, self.ctype = name, ctype
+        self.numpy_type, self.encoding = numpy_type, encoding
+
+    def __repr__(self):
+        return "<TypeInfo: %r %s %r %r>" % (self.name, self.ctype.__name__,
+                                            self.numpy_type, self.encoding)
+
+def register_type(name, ctype, numpy_type=None, encoding=None, aliases=()):
+    """Register a data type for value and raster conversion.
+    name is the Opticks type name (as reported by DataVariant.dv_type), or
+    None if the type only describes raster data. ctype is the ctypes type
+    of a single value, numpy_type the numpy dtype name and encoding the
+    Encoding value of raster data of this type. aliases are alternate
+    Opticks type names. Registering an existing name, numpy type or
+    encoding replaces the previous entry.
+
+    """
+    info = _TypeInfo(name, ctype, numpy_type, encoding)
+    if name is not None:
+        for key in (name,) + tuple(aliases):
+            _TYPES_BY_NAME[key] = info
+    _TYPES_BY_CTYPE[ctype] = info
+    if numpy_type is not None:
+        _TYPES_BY_NUMPY[numpy_type] = info
+    if encoding is not None:
+        _TYPES_BY_ENCODING[encoding] = info
+
+def _void_p_to_native(typename, value, owner=None):
+    """Convert a void pointer to a value of the named Opticks type.
+    Vector types are returned as ctypes arrays which alias the vector's
+    storage. The array holds a reference to owner, if specified, so the
+    storage is not freed while the array is in use.
+
+    """
     #pylint: disable=W0212
-    typ = None
-    isvector = False
-    if typename.startswith("vector<"):
-        typename = typename[7:-1]
-        isvector = True
-    if typename == "char":
-        typ = ctypes.c_byte
-    elif typename == "unsigned char":
-        typ = ctypes.c_ubyte
-    elif typename == "short":
-        typ = ctypes.c_short
-    elif typename == "unsigned short":
-        typ = ctypes.c_ushort
-    elif typename == "int":
-        typ = ctypes.c_int
-    elif typename == "unsigned int":
-        typ = ctypes.c_uint
-    elif typename == "long":
-        typ = ctypes.c_long
-    elif typename == "unsigned long":
-        typ = ctypes.c_ulong
-    elif typename == "Int64" or typename == "int64":
-        typ = ctypes.c_longlong
-    elif typename == "UInt64" or typename == "uint64":
-        typ = ctypes.c_ulonglong
-    elif typename == "float":
-        typ = ctypes.c_float
-    elif typename == "double":
-        typ = ctypes.c_double
-    else:
+    isvector = typename.startswith("vector<")
+    info = _TYPES_BY_NAME.get(isvector and typename[7:-1] or typename)
+    if info is None:
         return ctypes.cast(value, ctypes.c_void_p)
+    typ = info.ctype
     if isvector:
         rval = ctypes.c_void_p(0)
-        size = DataVariant._vectorToArray(value, "vector<%s>" % typename,
-                                          ctypes.byref(rval))
+        size = DataVariant._vectorToArray(value, typename, ctypes.byref(rval))
         size /= ctypes.sizeof(typ)
         typ = typ * size
-        return ctypes.cast(rval, ctypes.POINTER(typ)).contents
-    return ctypes.cast(value, ctypes.POINTER(typ)).contents.value
+        if size == 0:
+            return typ()
+        rval = ctypes.cast(rval, ctypes.POINTER(typ)).contents
+        if owner is not None:
+            rval._owner = owner
+        return rval
+    rval = ctypes.cast(value, ctypes.POINTER(typ)).contents
+    if isinstance(rval, ctypes._SimpleCData):
+        return rval.value
+    return rval
+
+def _ctypes_to_numpy(value):
+    """Wrap a ctypes array returned by _void_p_to_native() in a numpy array
+    without copying. Other values are returned unchanged.
+
+    """
+    if not isinstance(value, ctypes.Array):
+        return value
+    try:
+        import numpy
+    except ImportError:
+        raise NotImplementedError("numpy is not available")
+    return numpy.ctypeslib.as_array(value)
 
 def _prep_for_set(value, typ):
     #pylint: disable=W0212
@@ -182,41 +467,8 @@ def _prep_for_set(value, typ):
         rval = value.cast_data_element(typ)
         if rval != 0:
             retval = ctypes.c_void_p(rval)
-    elif typ == "char":
-        retval = ctypes.cast(ctypes.pointer(ctypes.c_byte(value)),
-                             ctypes.c_void_p)
-    elif typ == "short":
-        retval = ctypes.cast(ctypes.pointer(ctypes.c_short(value)),
-                             ctypes.c_void_p)
-    elif typ == "int":
-        retval = ctypes.cast(ctypes.pointer(ctypes.c_int(value)),
-                             ctypes.c_void_p)
-    elif typ == "long":
-        retval = ctypes.cast(ctypes.pointer(ctypes.c_long(value)),
-                             ctypes.c_void_p)
-    elif typ == "Int64":
-        retval = ctypes.cast(ctypes.pointer(ctypes.c_longlong(value)),
-                             ctypes.c_void_p)
-    elif typ == "unsigned char":
-        retval = ctypes.cast(ctypes.pointer(ctypes.c_ubyte(value)),
-                             ctypes.c_void_p)
-    elif typ == "unsigned short":
-        retval = ctypes.cast(ctypes.pointer(ctypes.c_ushort(value)),
-                             ctypes.c_void_p)
-    elif typ == "unsigned int":
-        retval = ctypes.cast(ctypes.pointer(ctypes.c_uint(value)),
-                             ctypes.c_void_p)
-    elif typ == "unsigned long":
-        retval = ctypes.cast(ctypes.pointer(ctypes.c_ulong(value)),
-                             ctypes.c_void_p)
-    elif typ == "UInt64":
-        retval = ctypes.cast(ctypes.pointer(ctypes.c_ulonglong(value)),
-                             ctypes.c_void_p)
-    elif typ == "float":
-        retval = ctypes.cast(ctypes.pointer(ctypes.c_float(value)),
-                             ctypes.c_void_p)
-    elif typ == "double":
-        retval = ctypes.cast(ctypes.pointer(ctypes.c_double(value)),
+    elif typ in _TYPES_BY_NAME:
+        retval = ctypes.cast(ctypes.pointer(_TYPES_BY_NAME[typ].ctype(value)),
                              ctypes.c_void_p)
     else: # try an XML string conversion
         retval = DataVariant._createDataVariantFromString(typ, str(value), 1)
@@ -226,6 +478,7 @@ class DataElement(ctypes.Structure, object):
     "An Opticks data element handle."
     _fields_ = [("handle", ctypes.c_void_p)]
     __owns = False
+    __type = None
 
     def __init__(self, name, wrapper=None):
         """Get a DataElement.
@@ -241,17 +494,14 @@ class DataElement(ctypes.Structure, object):
 
     @classmethod
     def cast(cls, subtype_as_void, typ):
-        tempf = _genwrap("castToDataElement", DataElement,
-                         ctypes.c_void_p, ctypes.c_char_p)
-        handle = tempf(subtype_as_void, typ).handle
+        handle = cls._castToDataElement(subtype_as_void, typ).handle
         newe = DataElement(None, wrapper = handle)
         return newe
 
     def __del__(self):
         if self.__owns:
-            tempf = _genwrap("destroyDataElement", None, DataElement,
-                             errorCheck=False)
-            tempf(self)
+            _STATISTICS.pop(self.handle, None)
+            self._destroyDataElement(self)
 
     def destroy(self, val=True):
         self.__owns = val
@@ -277,7 +527,10 @@ class DataElement(ctypes.Structure, object):
 
     @property
     def type(self):
-        return _stringbuffer_wrap(self._getDataElementType, self)
+        "The element type. This can't change so it is only fetched once."
+        if self.__type is None:
+            self.__type = _stringbuffer_wrap(self._getDataElementType, self)
+        return self.__type
 
     @property
     def filename(self):
@@ -311,11 +564,16 @@ class DataElement(ctypes.Structure, object):
     def copy_classification(self, element):
         return self._copy_classification(element, self)
 
+DataElement._castToDataElement = \
+    _genwrap("castToDataElement", DataElement,
+             ctypes.c_void_p, ctypes.c_char_p)
+DataElement._destroyDataElement = \
+    _genwrap("destroyDataElement", None, DataElement, errorCheck=False)
 DataElement._cast_data_element = \
     _genwrap("castDataElement", ctypes.c_void_p, DataElement, ctypes.c_char_p)
 DataElement._getDataElement = \
     _genwrap("getDataElement", DataElement,
-             ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int)
+             ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int, deferrable=False)
 DataElement._getDataElementName = \
     _genwrap("getDataElementName", ctypes.c_uint32, DataElement,
              ctypes.c_char_p, ctypes.c_uint32)
@@ -328,10 +586,18 @@ DataElement._getDataElementFilename = \
 DataElement._getDataElementChildCount = \
     _genwrap("getDataElementChildCount", ctypes.c_uint32, DataElement)
 DataElement._getDataElementChild = \
-    _genwrap("getDataElementChild", DataElement, DataElement, ctypes.c_uint32)
+    _genwrap("getDataElementChild", DataElement, DataElement, ctypes.c_uint32,
+             deferrable=False)
 DataElement._copy_classification = \
     _genwrap("copyClassification", None, DataElement, DataElement)
 
+def _python_int_type(value):
+    "Return the smallest Opticks integer type name which can hold value."
+    for name, low, high in _INT_RANGES:
+        if low < value < high:
+            return name
+    return None
+
 class DataVariant(ctypes.Structure):
     _fields_ = [("handle", ctypes.c_void_p)]
     __owns = False
@@ -358,38 +624,11 @@ class DataVariant(ctypes.Structure):
                                                              1).handle
                 return
             elif type(value) == types.IntType or type(value) == types.LongType:
-                if value < 0:
-                    if value > -(2**(ctypes.sizeof(ctypes.c_byte)*8)/2):
-                        vtype = "char"
-                        value = ctypes.pointer(ctypes.c_byte(value))
-                    elif value > -(2**(ctypes.sizeof(ctypes.c_short)*8)/2):
-                        vtype = "short"
-                        value = ctypes.pointer(ctypes.c_short(value))
-                    elif value > -(2**(ctypes.sizeof(ctypes.c_int)*8)/2):
-                        vtype = "int"
-                        value = ctypes.pointer(ctypes.c_int(value))
-                    elif value > -(2**(ctypes.sizeof(ctypes.c_long)*8)/2):
-                        vtype = "long"
-                        value = ctypes.pointer(ctypes.c_long(value))
-                    elif value > -(2**(ctypes.sizeof(ctypes.c_longlong)*8)/2):
-                        vtype = "Int64"
-                        value = ctypes.pointer(ctypes.c_longlong(value))
-                else:
-                    if value < 2**(ctypes.sizeof(ctypes.c_ubyte)*8):
-                        vtype = "unsigned char"
-                        value = ctypes.pointer(ctypes.c_ubyte(value))
-                    elif value < 2**(ctypes.sizeof(ctypes.c_ushort)*8):
-                        vtype = "unsigned short"
-                        value = ctypes.pointer(ctypes.c_ushort(value))
-                    elif value < 2**(ctypes.sizeof(ctypes.c_uint)*8):
-                        vtype = "unsigned int"
-                        value = ctypes.pointer(ctypes.c_uint(value))
-                    elif value < 2**(ctypes.sizeof(ctypes.c_ulong)*8):
-                        vtype = "unsigned long"
-                        value = ctypes.pointer(ctypes.c_ulong(value))
-                    elif value < 2**(ctypes.sizeof(ctypes.c_ulonglong)*8):
-                        vtype = "UInt64"
-                        value = ctypes.pointer(ctypes.c_ulonglong(value))
+                vtype = _python_int_type(value)
+                if vtype is None:
+                    raise OpticksError("Can't automatically convert %i." %
+                                       value)
+                value = ctypes.pointer(_TYPES_BY_NAME[vtype].ctype(value))
             elif type(value) == types.FloatType:
                 vtype, value = "float", ctypes.pointer(ctypes.c_float(value))
             else:
@@ -426,15 +665,35 @@ class DataVariant(ctypes.Structure):
     def dv_type(self):
         if not self.valid:
             return ""
-        buf = ctypes.create_string_buffer(32)
-        self._getDataVariantTypeName(self, buf, 32)
-        return ctypes.string_at(buf)
+        return _stringbuffer_wrap(self._getDataVariantTypeName, self)
 
-    @property
-    def value(self):
-        if self.dv_type == "string": # special case..can't handle std::string
+    def get_value(self, as_numpy=False):
+        """Get the value as a native Python type.
+        Vector values are returned as ctypes arrays, or as numpy arrays if
+        as_numpy is True. If this DataVariant owns its value the array is
+        not a copy; it shares memory with this DataVariant and keeps it
+        alive. Values owned by something else, such as a metadata attribute
+        which may be overwritten at any time, are copied.
+
+        """
+        typename = self.dv_type
+        if typename == "string": # special case..can't handle std::string
             return self.xml
-        return _void_p_to_native(self.dv_type, self._getDataVariantValue(self))
+        if self.__owns:
+            value = _void_p_to_native(typename,
+                                      self._getDataVariantValue(self), self)
+        else:
+            value = _void_p_to_native(typename,
+                                      self._getDataVariantValue(self))
+            if isinstance(value, ctypes.Array):
+                copy = type(value)()
+                ctypes.memmove(copy, value, ctypes.sizeof(value))
+                value = copy
+        if as_numpy:
+            value = _ctypes_to_numpy(value)
+        return value
+
+    value = property(get_value)
 
 class PlugInArgList(ctypes.Structure):
     _fields_ = [("handle", ctypes.c_void_p)]
@@ -542,8 +801,16 @@ class WizardNode(ctypes.Structure):
     def type(self):
         return _stringbuffer_wrap(self._getWizardNodeType, self)
 
-    def get_value(self):
-        value = _void_p_to_native(self.type, self._getWizardNodeValue(self))
+    def get_value(self, as_numpy=False):
+        """Get the node's value.
+        Vector values are returned as ctypes arrays, or as numpy arrays if
+        as_numpy is True, sharing memory with the node.
+
+        """
+        value = _void_p_to_native(self.type, self._getWizardNodeValue(self),
+                                  self)
+        if as_numpy:
+            value = _ctypes_to_numpy(value)
         if isinstance(value, ctypes.c_void_p):
             new_dv = DataVariant(value, self.type)
             if new_dv.valid:
@@ -846,6 +1113,50 @@ class DynamicObject(ctypes.Structure):
                                          meta, idx)
         return do_iter(self, len(self))
 
+    def to_dict(self, paths=None):
+        """Export this DynamicObject as a dictionary in a single traversal.
+        Nested DynamicObjects become nested dictionaries, numeric values
+        become Python numbers and numeric vectors become numpy arrays
+        (lists if numpy is not available). Strings and all other types
+        are returned as their XML string value.
+        If paths is specified it must be a sequence of '/' separated
+        attribute paths. Only those attributes are exported, each placed
+        at its path in the returned dictionary. Missing paths are skipped.
+
+        """
+        if paths is None:
+            return _dynamic_object_to_dict(self)
+        rval = {}
+        for path in paths:
+            keys = path.strip('/').split('/')
+            variant = self._getMetadataAttributeByPath(self, '/'.join(keys))
+            if not variant._isDataVariantValid(variant):
+                continue
+            node = rval
+            for key in keys[:-1]:
+                node = node.setdefault(key, {})
+            node[keys[-1]] = _variant_to_python(variant)
+        return rval
+
+    def update(self, mapping=None, **kargs):
+        """Set many attributes at once.
+        mapping may be a dictionary or a sequence of (key, value) pairs.
+        Keys may be '/' separated paths and nested dictionaries are
+        stored as nested DynamicObjects. Numbers, numpy scalars and
+        numeric sequences or numpy arrays are passed as native values.
+        Numeric vectors are never converted through an XML string.
+        Empty sequences and sequences of anything other than numbers
+        can't be stored.
+
+        """
+        if mapping is None:
+            mapping = {}
+        if hasattr(mapping, "items"):
+            mapping = mapping.items()
+        for items in (mapping, kargs.items()):
+            for key, value in items:
+                _update_dynamic_object(self, str(key).strip('/'), value)
+
     def __str__(self):
         return "<DynamicObject with %i attribute(s)>" % len(self)
 
@@ -858,16 +1169,12 @@ class ConfigurationSettings(object):
         self.__defaults = None
 
     def __getitem__(self, key):
-        tempf = _genwrap("getConfigurationSetting", DataVariant,
-                         ctypes.c_char_p)
-        return tempf(key)
+        return self._getConfigurationSetting(key)
 
     def __setitem__(self, key, value):
         if not isinstance(value, DataVariant):
             value = DataVariant(value)
-        tempf = _genwrap("setConfigurationSetting", ctypes.c_int,
-                         ctypes.c_char_p, DataVariant)
-        tempf(key, value)
+        self._setConfigurationSetting(key, value)
 
     def add_to_defaults(self, key):
         """Add the specified configuration setting to the defaults
@@ -877,16 +1184,12 @@ class ConfigurationSettings(object):
         """
         if self.__defaults is None:
             self.__defaults = DynamicObject()
-        tempf = _genwrap("copyConfigurationSetting", ctypes.c_int,
-                         ctypes.c_char_p, DynamicObject)
-        tempf(key, self.__defaults)
+        self._copyConfigurationSetting(key, self.__defaults)
 
     def serialize_defaults(self, filename):
         if self.__defaults is None:
             raise ValueError("No configuration settings in defaults.")
-        tempf = _genwrap("serializeConfigurationSettingDefaults",
-                         ctypes.c_int, ctypes.c_char_p, DynamicObject)
-        tempf(filename, self.__defaults)
+        self._serializeConfigurationSettingDefaults(filename, self.__defaults)
         self.clear_defaults()
 
     def clear_defaults(self):
@@ -914,13 +1217,163 @@ DynamicObject._setMetadataAttributeByPath = \
     _genwrap("setMetadataAttributeByPath", None, DynamicObject,
              ctypes.c_char_p, DataVariant)
 DynamicObject._removeMetadataAttribute = \
-    _genwrap("removeMetadataAttribute", None, DynamicObject, ctypes.c_char_p)
+    _genwrap("removeMetadataAttribute", None, DynamicObject, ctypes.c_char_p,
+             deferrable=False)
 DynamicObject._removeMetadataAttributeByPath = \
     _genwrap("removeMetadataAttributeByPath", None, DynamicObject,
-             ctypes.c_char_p)
+             ctypes.c_char_p, deferrable=False)
 DynamicObject._clearMetadata  = _genwrap("clearMetadata", None, DynamicObject)
 DataElement._getDataElementMetadata = \
-    _genwrap("getDataElementMetadata", DynamicObject, DataElement)
+    _genwrap("getDataElementMetadata", DynamicObject, DataElement,
+             deferrable=False)
+
+def _variant_to_python(variant):
+    """Convert a valid DataVariant to a plain Python value for
+    DynamicObject.to_dict().
+
+    """
+    #pylint: disable=W0212
+    typename = _stringbuffer_wrap(DataVariant._getDataVariantTypeName,
+                                  variant)
+    if typename == "DynamicObject":
+        return _dynamic_object_to_dict(
+            DynamicObject(DataVariant._getDataVariantValue(variant)))
+    if typename == "string":
+        return _stringbuffer_wrap(DataVariant._getDataVariantValueString,
+                                  variant, 1)
+    if typename == "bool":
+        return _stringbuffer_wrap(DataVariant._getDataVariantValueString,
+                                  variant, 1) == "true"
+    value = _void_p_to_native(typename,
+                              DataVariant._getDataVariantValue(variant))
+    if isinstance(value, ctypes.c_void_p):
+        return _stringbuffer_wrap(DataVariant._getDataVariantValueString,
+                                  variant, 1)
+    if isinstance(value, ctypes.Array):
+        # the array points into the variant so it must be copied
+        try:
+            import numpy
+            return numpy.ctypeslib.as_array(value).copy()
+        except ImportError:
+            return value[:]
+    return value
+
+def _dynamic_object_to_dict(dynobj):
+    "Recursively convert a DynamicObject to a dictionary."
+    #pylint: disable=W0212
+    rval = {}
+    for idx in xrange(DynamicObject._getMetadataAttributeCount(dynobj)):
+        name = _stringbuffer_wrap(DynamicObject._getMetadataAttributeName,
+                                  dynobj, idx)
+        variant = DynamicObject._getMetadataAttribute(dynobj, name)
+        rval[name] = _variant_to_python(variant)
+    return rval
+
+_VECTOR_TEMPLATES = {}
+_MAX_VECTOR_TEMPLATES = 64
+
+def _vector_variant(typename, data, count):
+    """Create a vector<typename> DataVariant holding count elements
+    copied from the buffer at address data.
+    The Simple API can only build vectors from XML so an XML template of
+    each (type, length) is parsed once. Later vectors are native copies of
+    the template which are then overwritten in place.
+
+    """
+    #pylint: disable=W0212
+    vtype = "vector<%s>" % typename
+    template = _VECTOR_TEMPLATES.get((vtype, count))
+    if template is None:
+        if len(_VECTOR_TEMPLATES) >= _MAX_VECTOR_TEMPLATES:
+            _VECTOR_TEMPLATES.clear()
+        template = DataVariant(", ".join(["0"] * count), vtype)
+        _VECTOR_TEMPLATES[(vtype, count)] = template
+    rval = DataVariant(
+        ctypes.c_void_p(DataVariant._getDataVariantValue(template)), vtype)
+    if count > 0:
+        dest = ctypes.c_void_p(0)
+        size = DataVariant._vectorToArray(
+            DataVariant._getDataVariantValue(rval), vtype, ctypes.byref(dest))
+        ctypes.memmove(dest, data, size)
+    return rval
+
+def _native_variant(value):
+    """Convert a Python value to a DataVariant for DynamicObject.update()
+    without going through XML when a native representation exists.
+
+    """
+    if isinstance(value, DataVariant):
+        return value
+    if isinstance(value, DynamicObject):
+        return DataVariant(ctypes.c_void_p(value.handle), "DynamicObject")
+    if isinstance(value, bool):
+        # C++ bool is a single byte
+        return DataVariant(ctypes.cast(ctypes.pointer(ctypes.c_ubyte(value)),
+                                       ctypes.c_void_p), "bool")
+    # numpy scalars may subclass int or float so they are handled first
+    numpy = sys.modules.get("numpy")
+    if numpy is not None and isinstance(value, numpy.generic):
+        info = _TYPES_BY_NUMPY.get(value.dtype.name)
+        if info is None or info.name is None:
+            return _native_variant(value.item())
+        arr = numpy.array(value)
+        return DataVariant(ctypes.c_void_p(arr.ctypes.data), info.name)
+    if numpy is not None and isinstance(value, numpy.ndarray):
+        if value.size == 0:
+            raise ValueError("Can't store an empty array.")
+        info = _TYPES_BY_NUMPY.get(value.dtype.name)
+        if info is None or info.name is None:
+            return _native_variant(value.ravel().tolist())
+        arr = numpy.ascontiguousarray(value.ravel())
+        return _vector_variant(info.name, arr.ctypes.data, arr.size)
+    if isinstance(value, (int, long, float, str)):
+        return DataVariant(value)
+    if isinstance(value, (list, tuple)):
+        if len(value) == 0:
+            raise ValueError("Can't store an empty sequence.")
+        items = []
+        for item in value:
+            if numpy is not None and isinstance(item, numpy.generic):
+                item = item.item()
+            if isinstance(item, bool) or \
+               not isinstance(item, (int, long, float)):
+                raise OpticksError("Can't automatically convert a sequence "
+                                   "containing %s." % str(type(item)))
+            items.append(item)
+        if [v for v in items if isinstance(v, float)]:
+            typename, typ = "double", ctypes.c_double
+        elif min(items) >= -2**31 and max(items) < 2**31:
+            typename, typ = "int", ctypes.c_int
+        else:
+            typename, typ = "Int64", ctypes.c_longlong
+        arr = (typ * len(items))(*items)
+        return _vector_variant(typename, arr, len(items))
+    return DataVariant(value)
+
+def _update_dynamic_object(dynobj, key, value):
+    "Store value at path key, recursing into nested dictionaries."
+    #pylint: disable=W0212
+    if isinstance(value, dict) and len(value) == 0:
+        value = DynamicObject()
+    elif isinstance(value, dict):
+        for subkey, subvalue in value.items():
+            _update_dynamic_object(dynobj, "%s/%s" % (key, subkey), subvalue)
+        return
+    variant = _native_variant(value)
+    if not variant.valid:
+        raise ValueError("Invalid 'DataVariant' value for '%s'." % key)
+    DynamicObject._setMetadataAttributeByPath(dynobj, key, variant)
+ConfigurationSettings._getConfigurationSetting = \
+    _genwrap("getConfigurationSetting", DataVariant, ctypes.c_char_p)
+ConfigurationSettings._setConfigurationSetting = \
+    _genwrap("setConfigurationSetting", ctypes.c_int,
+             ctypes.c_char_p, DataVariant)
+ConfigurationSettings._copyConfigurationSetting = \
+    _genwrap("copyConfigurationSetting", ctypes.c_int,
+             ctypes.c_char_p, DynamicObject)
+ConfigurationSettings._serializeConfigurationSettingDefaults = \
+    _genwrap("serializeConfigurationSettingDefaults", ctypes.c_int,
+             ctypes.c_char_p, DynamicObject)
 
 class IntComplex32(ctypes.Structure):
     "Integer complex with 16-bit real and 16-bit imaginary elements."
@@ -943,110 +1396,63 @@ class Encoding(ctypes.c_uint32):
     FLT8COMPLEX = 8
     FLT8BYTES = 9
 
+    _names = {INT1SBYTE:"INT1SBYTE", INT1UBYTE:"INT1UBYTE",
+              INT2SBYTES:"INT2SBYTES", INT2UBYTES:"INT2UBYTES",
+              INT4SCOMPLEX:"INT4SCOMPLEX", INT4SBYTES:"INT4SBYTES",
+              INT4UBYTES:"INT4UBYTES", FLT4BYTES:"FLT4BYTES",
+              FLT8COMPLEX:"FLT8COMPLEX", FLT8BYTES:"FLT8BYTES"}
+
     def __repr__(self):
-        if self.value == self.INT1SBYTE:
-            strname = "INT1SBYTE"
-        elif self.value == self.INT1UBYTE:
-            strname = "INT1UBYTE"
-        elif self.value == self.INT2SBYTES:
-            strname = "INT2SBYTES"
-        elif self.value == self.INT2UBYTES:
-            strname = "INT2UBYTES"
-        elif self.value == self.INT4SBYTES:
-            strname = "INT4SBYTES"
-        elif self.value == self.INT4UBYTES:
-            strname = "INT4UBYTES"
-        elif self.value == self.INT4SCOMPLEX:
-            strname = "INT4SCOMPLEX"
-        elif self.value == self.FLT4BYTES:
-            strname = "FLT4BYTES"
-        elif self.value == self.FLT8BYTES:
-            strname = "FLT8BYTES"
-        elif self.value == self.FLT8COMPLEX:
-            strname = "FLT8COMPLEX"
-        else:
-            strname = "Unknown"
-        return "<Encoding: %s>" % strname
+        return "<Encoding: %s>" % self._names.get(self.value, "Unknown")
 
     def to_ctype(self):
         "Return an appropriate ctypes data type for this encoding type."
-        retval = None
-        if self.value == self.INT1SBYTE:
-            retval = ctypes.POINTER(ctypes.c_int8)
-        elif self.value == self.INT1UBYTE:
-            retval = ctypes.POINTER(ctypes.c_uint8)
-        elif self.value == self.INT2SBYTES:
-            retval = ctypes.POINTER(ctypes.c_int16)
-        elif self.value == self.INT2UBYTES:
-            retval = ctypes.POINTER(ctypes.c_uint16)
-        elif self.value == self.INT4SBYTES:
-            retval = ctypes.POINTER(ctypes.c_int32)
-        elif self.value == self.INT4UBYTES:
-            retval = ctypes.POINTER(ctypes.c_uint32)
-        elif self.value == self.INT4SCOMPLEX:
-            retval = ctypes.POINTER(IntComplex32)
-        elif self.value == self.FLT4BYTES:
-            retval = ctypes.POINTER(ctypes.c_float)
-        elif self.value == self.FLT8BYTES:
-            retval = ctypes.POINTER(ctypes.c_double)
-        elif self.value == self.FLT8COMPLEX:
-            retval = ctypes.POINTER(FloatComplex64)
-        else:
-            retval = ctypes.c_void_p
-        return retval
+        info = _TYPES_BY_ENCODING.get(self.value)
+        if info is None:
+            return ctypes.c_void_p
+        return ctypes.POINTER(info.ctype)
 
     def to_numpy_type(self):
         "Return an appropriate numpy dtype for this encoding type."
-        retval = None
-        if self.value == self.INT1SBYTE:
-            retval = "int8"
-        elif self.value == self.INT1UBYTE:
-            retval = "uint8"
-        elif self.value == self.INT2SBYTES:
-            retval = "int16"
-        elif self.value == self.INT2UBYTES:
-            retval = "uint16"
-        elif self.value == self.INT4SBYTES:
-            retval = "int32"
-        elif self.value == self.INT4UBYTES:
-            retval = "uint32"
-        elif self.value == self.INT4SCOMPLEX:
-            retval = "i2i2"
-        elif self.value == self.FLT4BYTES:
-            retval = "float32"
-        elif self.value == self.FLT8BYTES:
-            retval = "float64"
-        elif self.value == self.FLT8COMPLEX:
-            retval = "complex64"
-        else:
-            retval = "void"
-        return retval
+        info = _TYPES_BY_ENCODING.get(self.value)
+        if info is None or info.numpy_type is None:
+            return "void"
+        return info.numpy_type
 
     @classmethod
     def from_numpy_type(cls, typestr):
-        "Return an appropriate numpy dtype for this encoding type."
-        retval = None
-        if typestr == "int8":
-            retval = cls.INT1SBYTE
-        elif typestr == "uint8":
-            retval = cls.INT1UBYTE
-        elif typestr == "int16":
-            retval = cls.INT2SBYTES
-        elif typestr == "uint16":
-            retval = cls.INT2UBYTES
-        elif typestr == "int32":
-            retval = cls.INT4SBYTES
-        elif typestr == "uint32":
-            retval = cls.INT4UBYTES
-        elif typestr == "float32":
-            retval = cls.FLT4BYTES
-        elif typestr == "float64":
-            retval = cls.FLT8BYTES
-        elif typestr == "complex64":
-            retval = cls.FLT8COMPLEX
-        else:
+        "Return the encoding type for a numpy dtype or dtype name."
+        info = _TYPES_BY_NUMPY.get(getattr(typestr, "name", typestr))
+        if info is None or info.encoding is None:
             raise TypeError("'%s' can't be represented in Opticks." % typestr)
-        return retval
+        return info.encoding
+
+register_type("char", ctypes.c_byte, "int8", Encoding.INT1SBYTE)
+register_type("unsigned char", ctypes.c_ubyte, "uint8", Encoding.INT1UBYTE)
+register_type("short", ctypes.c_short, "int16", Encoding.INT2SBYTES)
+register_type("unsigned short", ctypes.c_ushort, "uint16",
+              Encoding.INT2UBYTES)
+register_type("int", ctypes.c_int, "int32", Encoding.INT4SBYTES)
+register_type("unsigned int", ctypes.c_uint, "uint32", Encoding.INT4UBYTES)
+register_type("long", ctypes.c_long)
+register_type("unsigned long", ctypes.c_ulong)
+register_type("Int64", ctypes.c_longlong, "int64", aliases=("int64",))
+register_type("UInt64", ctypes.c_ulonglong, "uint64", aliases=("uint64",))
+register_type("float", ctypes.c_float, "float32", Encoding.FLT4BYTES)
+register_type("double", ctypes.c_double, "float64", Encoding.FLT8BYTES)
+register_type(None, IntComplex32, "i2i2", Encoding.INT4SCOMPLEX)
+register_type(None, FloatComplex64, "complex64", Encoding.FLT8COMPLEX)
+
+# negative values use the smallest signed type, others the smallest unsigned
+_INT_RANGES = []
+for _name in ("char", "short", "int", "long", "Int64"):
+    _bits = ctypes.sizeof(_TYPES_BY_NAME[_name].ctype) * 8
+    _INT_RANGES.append((_name, -(2**_bits)/2, 0))
+for _name in ("unsigned char", "unsigned short", "unsigned int",
+              "unsigned long", "UInt64"):
+    _bits = ctypes.sizeof(_TYPES_BY_NAME[_name].ctype) * 8
+    _INT_RANGES.append((_name, -1, 2**_bits))
+del _name, _bits
 
 class Interleave(ctypes.c_uint32):
     "Opticks data interleave format."
@@ -1054,14 +1460,10 @@ class Interleave(ctypes.c_uint32):
     BIP = 1
     BIL = 2
 
+    _names = {BSQ:"BSQ", BIP:"BIP", BIL:"BIL"}
+
     def __repr__(self):
-        if self.value == self.BSQ:
-            return "<Interleave: BSQ>"
-        elif self.value == self.BIP:
-            return "<Interleave: BIP>"
-        elif self.value == self.BIL:
-            return "<Interleave: BIL>"
-        return "<Interleave: Unknown"
+        return "<Interleave: %s>" % self._names.get(self.value, "Unknown")
 
 class ProcessingLocationPreference(ctypes.c_uint32):
     "Processing location hint for creation of raster elements."
@@ -1069,14 +1471,12 @@ class ProcessingLocationPreference(ctypes.c_uint32):
     RAM = 1
     ONDISK = 2
 
+    _names = {PREFER_RAM:"prefer in memory", RAM:"in memory only",
+              ONDISK:"on-disk only"}
+
     def __repr__(self):
-        if self.value == self.ONDISK:
-            return "<ProcessingLocationPreference: on-disk only>"
-        elif self.value == self.RAM:
-            return "<ProcessingLocationPreference: in memory only>"
-        elif self.value == self.PREFER_RAM:
-            return "<ProcessingLocationPreference: prefer in memory>"
-        return "<Interleave: Unknown"
+        return ("<ProcessingLocationPreference: %s>" %
+                self._names.get(self.value, "Unknown"))
 
 class DataInfo(ctypes.Structure):
     "Information about a raster element."
@@ -1089,23 +1489,43 @@ class DataInfo(ctypes.Structure):
                 ("num_bad_values", ctypes.c_uint32),
                 ("p_bad_values", ctypes.POINTER(ctypes.c_int32))]
 
+    __coreOwns = False
+    __frozen = False
+
     def __init__(self, *args):
         #pylint: disable=W0231
         pass # don't call the base class __init__
 
     def __new__(cls, data_element=None):
-        create_data_info = _genwrap("createDataInfo",
-                                    ctypes.POINTER(DataInfo), DataElement)
-        rval = create_data_info(data_element).contents
+        rval = cls._createDataInfo(data_element).contents
         if rval:
             rval.__coreOwns = True
         return rval
 
     def __del__(self):
         if self.__coreOwns:
-            tempf = _genwrap("destroyDataInfo", None,
-                             ctypes.POINTER(DataInfo), errorCheck=False)
-            tempf(self)
+            self._destroyDataInfo(self)
+
+    def __setattr__(self, name, value):
+        if self.__frozen:
+            raise AttributeError("DataInfo is read-only")
+        ctypes.Structure.__setattr__(self, name, value)
+
+    def _freeze(self):
+        "Make this DataInfo read-only so it can be safely shared."
+        ctypes.Structure.__setattr__(self, "_DataInfo__frozen", True)
+
+    def _copy(self):
+        """Return a mutable copy of this DataInfo. The copy holds its own
+        bad values so it stays valid after this DataInfo is destroyed.
+
+        """
+        #pylint: disable=W0201
+        rval = ctypes.Structure.__new__(DataInfo)
+        ctypes.memmove(ctypes.addressof(rval), ctypes.addressof(self),
+                       ctypes.sizeof(DataInfo))
+        rval.bad_values = self.bad_values
+        return rval
 
     def __repr__(self):
         return ("<DataInfo: %i,%i,%i %s %s>" %
@@ -1121,15 +1541,21 @@ class DataInfo(ctypes.Structure):
     def set_bad_values(self, val):
         #pylint: disable=W0201
         assert(isinstance(val, list))
+        values = (ctypes.c_int32 * len(val))(*val)
+        # the array must live as long as the pointer to it
+        self.__bad_values = values
         self.num_bad_values = len(val)
-        tempv = (ctypes.c_int32 * self.num_bad_values)
-        self.p_bad_values = ctypes.cast(ctypes.POINTER(ctypes.c_int32),
-                                        tempv)
-        for idx in range(self.num_bad_values):
-            self.p_bad_values[idx] = ctypes.c_int32(val[idx])
+        self.p_bad_values = ctypes.cast(values, ctypes.POINTER(ctypes.c_int32))
 
     bad_values = property(get_bad_values, set_bad_values)
 
+DataInfo._createDataInfo = \
+    _genwrap("createDataInfo", ctypes.POINTER(DataInfo), DataElement,
+             deferrable=False)
+DataInfo._destroyDataInfo = \
+    _genwrap("destroyDataInfo", None, ctypes.POINTER(DataInfo),
+             errorCheck=False)
+
 class RasterElementArgs(ctypes.Structure):
     "Argument structure for creation of a new raster element."
     #pylint: disable=R0902
@@ -1248,39 +1674,28 @@ class AoiIterator(ctypes.Structure):
         try:
             if raster is not None:
                 if element is None:
-                    tempf = _genwrap("createAoiIteratorOverRaster",
-                                     AoiIterator, ctypes.c_void_p, DataElement)
-                    self.handle = tempf(element, raster).handle
+                    tempf = self._createAoiIteratorOverRasterNoAoi
                 else:
-                    tempf = _genwrap("createAoiIteratorOverRaster",
-                                     AoiIterator, DataElement, DataElement)
-                    self.handle = tempf(element, raster).handle
+                    tempf = self._createAoiIteratorOverRaster
+                self.handle = tempf(element, raster).handle
             else:
                 if element is None:
-                    tempf = _genwrap("createAoiIteratorOverBoundingBox",
-                                     AoiIterator, ctypes.c_void_p,
-                                     ctypes.c_int32, ctypes.c_int32,
-                                     ctypes.c_int32, ctypes.c_int32)
-                    self.handle = tempf(element, bounding_box[0],
-                                        bounding_box[1], bounding_box[2],
-                                        bounding_box[3]).handle
+                    tempf = self._createAoiIteratorOverBoundingBoxNoAoi
                 else:
-                    tempf = _genwrap("createAoiIteratorOverBoundingBox",
-                                     AoiIterator, DataElement,
-                                     ctypes.c_int32, ctypes.c_int32,
-                                     ctypes.c_int32, ctypes.c_int32)
-                    self.handle = tempf(element, bounding_box[0],
-                                        bounding_box[1], bounding_box[2],
-                                        bounding_box[3]).handle
+                    tempf = self._createAoiIteratorOverBoundingBox
+                self.handle = tempf(element, bounding_box[0],
+                                    bounding_box[1], bounding_box[2],
+                                    bounding_box[3]).handle
             self.__last = False
         except SimpleApiError, err:
             if err.code == SimpleApiError.SIMPLE_NOT_FOUND:
-                self.__last = False
+                # no selected pixels
+                self.__last = True
         self.__first, self.__owns = True, True
 
     def __del__(self):
         if self.__owns:
-            _genwrap("freeAoiIterator", None, AoiIterator)(self)
+            self._freeAoiIterator(self)
 
     def __iter__(self):
         return self
@@ -1297,6 +1712,22 @@ class AoiIterator(ctypes.Structure):
                                      ctypes.byref(column),
                                      ctypes.byref(row))
         return column.value, row.value
+AoiIterator._createAoiIteratorOverRasterNoAoi = \
+    _genwrap("createAoiIteratorOverRaster", AoiIterator,
+             ctypes.c_void_p, DataElement, deferrable=False)
+AoiIterator._createAoiIteratorOverRaster = \
+    _genwrap("createAoiIteratorOverRaster", AoiIterator,
+             DataElement, DataElement, deferrable=False)
+AoiIterator._createAoiIteratorOverBoundingBoxNoAoi = \
+    _genwrap("createAoiIteratorOverBoundingBox", AoiIterator,
+             ctypes.c_void_p, ctypes.c_int32, ctypes.c_int32,
+             ctypes.c_int32, ctypes.c_int32, deferrable=False)
+AoiIterator._createAoiIteratorOverBoundingBox = \
+    _genwrap("createAoiIteratorOverBoundingBox", AoiIterator,
+             DataElement, ctypes.c_int32, ctypes.c_int32,
+             ctypes.c_int32, ctypes.c_int32, deferrable=False)
+AoiIterator._freeAoiIterator = \
+    _genwrap("freeAoiIterator", None, AoiIterator)
 AoiIterator._nextAoiIterator = \
     _genwrap("nextAoiIterator", ctypes.c_int, AoiIterator)
 AoiIterator._getAoiIteratorLocation = \
@@ -1384,28 +1815,94 @@ class Aoi(DataElement):
         bbox = (min_column, min_row, max_column, max_row)
         return AoiIterator(self, bounding_box = bbox)
 
+    def get_mask(self, min_column, min_row, max_column, max_row):
+        """Get a (rows, columns) boolean numpy array which is True for the
+        selected pixels within the specified pixel coordinates. The AOI
+        is iterated once and the mask is filled in a single operation.
+
+        """
+        try:
+            import numpy
+        except ImportError:
+            raise NotImplementedError("numpy is not available")
+        mask = numpy.zeros((max_row - min_row + 1,
+                            max_column - min_column + 1), dtype=bool)
+        columns, rows = [], []
+        for column, row in self.iter_bounding(min_column, min_row,
+                                              max_column, max_row):
+            columns.append(column)
+            rows.append(row)
+        if rows:
+            mask[numpy.array(rows) - min_row,
+                 numpy.array(columns) - min_column] = True
+        return mask
+
 class DataAccessor(ctypes.Structure):
     """Wrapper for an Opticks data accessor. This is the most
     flexible data access method but is also the most complex.
 
     """
     _fields_ = [("handle", ctypes.c_void_p)]
+    __args = None
+    __raster = None
+    __writable = False
 
     def __del__(self):
+        self.__written()
         if self.__owns:
-            tempf = _genwrap("destroyDataAccessor", None, DataAccessor,
-                             errorCheck=False)
-            tempf(self)
+            self._destroyDataAccessor(self)
 
     def initialize(self, *args):
         #pylint: disable=W0201
         "Not user callable...this is used by RasterElement.get_data_accessor"
-        # args = owns, encoding, colcount, writable
-        self.__owns, self.__encoding, self.__col_count, self.__writable = args
+        # args = owns, encoding, colcount, writable[, DataAccessorArgs
+        #        [, raster handle]]
+        self.__owns, self.__encoding, self.__col_count, self.__writable = \
+            args[:4]
+        if len(args) > 4:
+            self.__args = args[4]
+        if len(args) > 5:
+            self.__raster = args[5]
+
+    def __written(self):
+        """Discard the statistics cached for the raster element when this
+        accessor hands out or writes writable memory.
+
+        """
+        if self.__writable and self.__raster is not None:
+            _STATISTICS.pop(self.__raster, None)
+
+    def __row_array(self, rows=1):
+        """Create a numpy view of rows rows starting at the current row.
+        Each row is shaped (columns,) or (columns, values) for BIP data
+        and (values, columns) for BIL data.
+
+        """
+        try:
+            import numpy
+        except ImportError:
+            raise NotImplementedError("numpy is not available")
+        typ = self.__encoding._type_
+        count = self.row_size / ctypes.sizeof(typ)
+        per_column = max(count / self.__col_count, 1)
+        data = numpy.ctypeslib.as_array(
+            (typ * (count * rows)).from_address(
+                self._getDataAccessorRow(self)))
+        data = data.reshape(rows, count)[:, :per_column * self.__col_count]
+        if self.__args is not None and \
+                self.__args.interleave.value == Interleave.BIL:
+            data = data.reshape(rows, per_column, self.__col_count)
+        elif per_column > 1:
+            data = data.reshape(rows, self.__col_count, per_column)
+        if not self.__writable:
+            data.flags.writeable = False
+        self.__written()
+        return data
 
     @property
     def row(self):
         "Get a ctypes pointer to the current row."
+        self.__written()
         return ctypes.cast(ctypes.c_void_p(self._getDataAccessorRow(self)),
                            self.__encoding)
 
@@ -1420,6 +1917,7 @@ class DataAccessor(ctypes.Structure):
     @property
     def column(self):
         "Get a ctypes pointer to the current column."
+        self.__written()
         return ctypes.cast(ctypes.c_void_p(self._getDataAccessorColumn(self)),
                            self.__encoding)
 
@@ -1445,17 +1943,138 @@ class DataAccessor(ctypes.Structure):
     def to_pixel(self, row, column):
         self._to_pixel(self, row, column)
 
-    def iter_rows(self, incr = 1):
+    def gather(self, rows, columns):
+        """Read the pixels at a sequence of (rows[i], columns[i]) locations.
+        rows and columns are sequences or numpy arrays of raster pixel
+        coordinates. The locations are sorted by row and each row is
+        accessed once, so sparse samples cost a few calls per distinct row
+        instead of several per pixel. Returns a numpy array in the order
+        of the locations with one value per pixel, or a (pixels, values)
+        array if the accessor has several values per pixel, such as the
+        bands of a BIP accessor. A BSQ accessor only reaches one band, so
+        OpticksError is raised if it was created for several bands.
+
+        """
+        return self.__sparse_access(rows, columns, None)
+
+    def scatter(self, rows, columns, values):
+        """Write values to the pixels at a sequence of (rows[i], columns[i])
+        locations. values is laid out as the result of gather() or may be
+        a single value for every pixel. See gather() for details.
+
+        """
+        if not self.__writable:
+            raise OpticksError("Accessor is read-only")
+        self.__sparse_access(rows, columns, values)
+        self.__written()
+
+    def __sparse_access(self, rows, columns, values):
+        "Implementation of gather() and scatter()."
+        #pylint: disable=R0914
+        try:
+            import numpy
+        except ImportError:
+            raise NotImplementedError("numpy is not available")
+        if self.__args is not None and \
+                self.__args.interleave.value == Interleave.BSQ and \
+                self.__args.band_end != self.__args.band_start:
+            raise OpticksError("Sparse access to a BSQ accessor requires "
+                               "a single band")
+        rows = numpy.asarray(rows, dtype=numpy.int64).ravel()
+        columns = numpy.asarray(columns, dtype=numpy.int64).ravel()
+        if rows.shape != columns.shape:
+            raise ValueError("rows and columns must have the same length")
+        typ = self.__encoding._type_
+        per_column = max(self.row_size / ctypes.sizeof(typ) /
+                         self.__col_count, 1)
+        col_start = 0
+        if self.__args is not None:
+            col_start = self.__args.column_start
+        if values is None:
+            result = numpy.empty((len(rows), per_column), dtype=typ)
+        else:
+            values = numpy.asarray(values)
+            if values.ndim == 1 and len(rows) > 0:
+                values = values.reshape(len(rows), -1)
+        order = numpy.argsort(rows, kind='mergesort')
+        breaks = list(numpy.flatnonzero(numpy.diff(rows[order])) + 1)
+        for start, end in zip([0] + breaks, breaks + [len(order)]):
+            if start == end:
+                continue
+            idx = order[start:end]
+            row = int(rows[idx[0]])
+            cols = columns[idx] - col_start
+            self.to_pixel(row, col_start)
+            if not self.valid or cols.min() < 0 or \
+                    cols.max() >= self.__col_count:
+                bad = (cols < 0) | (cols >= self.__col_count)
+                raise OpticksError("Location (%i, %i) is invalid." %
+                                   (row, columns[idx][bad.argmax()]))
+            data = self.__row_array()[0]
+            if data.ndim == 1:
+                data = data[:, numpy.newaxis]
+            elif self.__args is not None and \
+                    self.__args.interleave.value == Interleave.BIL:
+                data = data.T
+            if values is None:
+                result[idx] = data[cols]
+            elif values.ndim == 0:
+                data[cols] = values
+            else:
+                data[cols] = values[idx]
+        if values is None:
+            if per_column == 1:
+                return result[:, 0]
+            return result
+
+    def iter_rows(self, incr = 1, as_numpy = False):
         """Create an iterator across rows which accesses
-        the entire row each iteration.
+        the entire row each iteration. If as_numpy is True, each
+        row is a numpy view of the accessor's memory shaped (columns,)
+        or (columns, values) for BIP and (values, columns) for BIL
+        accessors. The view is writable if the accessor is writable and
+        is only valid until the accessor moves to the next row.
 
         """
         def do_iter(acc, incr):
             while acc.valid:
                 yield acc.row
                 acc.next_row(incr)
+        def do_iter_numpy(acc, incr):
+            while acc.valid:
+                yield acc.__row_array()[0]
+                acc.next_row(incr)
+        if as_numpy:
+            return do_iter_numpy(self, incr)
         return do_iter(self, incr)
 
+    def iter_row_blocks(self, rows = None):
+        """Create an iterator across all of the accessor's rows which
+        yields (first row, block) pairs. Each block is a numpy view of up
+        to rows consecutive rows, shaped (rows,) + the row shape described
+        in iter_rows(). rows defaults to the accessor's concurrent row
+        count and must not exceed it. The iterator starts at the
+        accessor's first row and each block is only valid until the
+        next block is requested.
+
+        """
+        if self.__args is None:
+            raise OpticksError("Accessor has no row range")
+        args = self.__args
+        if rows is None:
+            rows = max(args.concurrent_rows, 1)
+        elif rows > max(args.concurrent_rows, 1):
+            raise ValueError("rows can not exceed the concurrent row count")
+        def do_iter(acc, args, rows):
+            row = args.row_start
+            acc.to_pixel(row, args.column_start)
+            while acc.valid and row <= args.row_end:
+                count = min(rows, args.row_end - row + 1)
+                yield row, acc.__row_array(count)
+                acc.next_row(count)
+                row += count
+        return do_iter(self, args, rows)
+
     def iter_columns(self, incr = 1):
         "Create an iteractor across columns in the current row."
         def do_iter(acc, col_count, incr):
@@ -1473,6 +2092,8 @@ class DataAccessor(ctypes.Structure):
     def row_size(self):
         return self._rowsize(self)
 
+DataAccessor._destroyDataAccessor = \
+    _genwrap("destroyDataAccessor", None, DataAccessor, errorCheck=False)
 DataAccessor._getDataAccessorRow = \
     _genwrap("getDataAccessorRow", ctypes.c_void_p, DataAccessor)
 DataAccessor._getDataAccessorColumn = \
@@ -1490,10 +2111,20 @@ DataAccessor._to_pixel = \
     _genwrap("toDataAccessorPixel", None, DataAccessor, ctypes.c_uint32,
              ctypes.c_uint32)
 
+# A private prototype so the shared ctypes.pythonapi entry is left alone.
+# Pointers must not be passed as C ints on 64-bit platforms.
+_PyBuffer_FromMemory = \
+    ctypes.PYFUNCTYPE(ctypes.py_object, ctypes.c_void_p, ctypes.c_size_t)(
+        ("PyBuffer_FromMemory", ctypes.pythonapi))
+
+def _buffer_from_memory(ptr, size):
+    "Wrap size bytes at address ptr in a read-only buffer without copying."
+    return _PyBuffer_FromMemory(ptr, size)
+
 _RASTER_BLOCK_TYPE = None
 def _create_raster_block():
-    #pylint: disable=W0603, W0621
-    global _RASTER_BLOCK_TYPE
+    #pylint: disable=W0603, W0621, C0103
+    global _RASTER_BLOCK_TYPE, RasterBlock
     try:
         import numpy
         class RasterBlock(numpy.ndarray):
@@ -1504,16 +2135,14 @@ def _create_raster_block():
                 rows = args.row_end - args.row_start + 1
                 cols = args.column_end - args.column_start + 1
                 bands = args.band_end - args.band_start + 1
-                nfo = DataInfo(raster)
-                func = ctypes.pythonapi.PyBuffer_FromMemory
-                func.restype = ctypes.py_object
+                nfo = _data_info(raster)
                 datalen = rows * cols * bands * nfo.encoding_size
-                dbuffer = func(ptr, datalen)
-                if nfo.interleave.value == Interleave.BIP:
+                dbuffer = _buffer_from_memory(ptr, datalen)
+                if args.interleave.value == Interleave.BIP:
                     shape = (rows, cols, bands)
-                elif nfo.interleave.value == Interleave.BSQ:
+                elif args.interleave.value == Interleave.BSQ:
                     shape = (bands, rows, cols)
-                elif nfo.interleave.value == Interleave.BIL:
+                elif args.interleave.value == Interleave.BIL:
                     shape = (rows, bands, cols)
                 ntype = nfo.encoding.to_numpy_type()
                 self = numpy.ndarray.__new__(cls, shape,
@@ -1523,7 +2152,7 @@ def _create_raster_block():
                 self._rasterhandle = dbuffer
                 self._rasterptr = ptr
                 self._ownraster = own
-                self.interleave = nfo.interleave
+                self.interleave = args.interleave
                 return self
             def __array_finalize__(self, obj):
                 if hasattr(obj, '_rasterhandle'):
@@ -1542,9 +2171,7 @@ def _create_raster_block():
 
                 """
                 if self.base is self._rasterhandle and self._ownraster:
-                    tempf = _genwrap("destroyDataPointer", None,
-                                     ctypes.c_void_p, errorCheck=False)
-                    tempf(self._rasterptr)
+                    RasterElement._destroyDataPointer(self._rasterptr)
                     self._rasterhandle = None
                     self._rasterptr = None
                     self._ownraster = False
@@ -1560,15 +2187,39 @@ def _create_raster_block():
     except ImportError:
         pass
 
-try:
-    #pylint: disable=C0103
-    #try on first import to define RasterBlock type
-    #if numpy can be imported
-    import numpy
-    _create_raster_block()
-    RasterBlock = _RASTER_BLOCK_TYPE
-except ImportError:
-    pass
+def _raster_block_type():
+    """Return the RasterBlock type, defining it if needed. Raises
+    NotImplementedError if numpy is not available.
+
+    """
+    if _RASTER_BLOCK_TYPE is None:
+        _create_raster_block()
+        if _RASTER_BLOCK_TYPE is None:
+            raise NotImplementedError("numpy is not available")
+    return _RASTER_BLOCK_TYPE
+
+# RasterBlock is public API so it is defined whenever numpy can be imported.
+_create_raster_block()
+
+def _data_info(raster):
+    "Get the DataInfo for raster, using the cached copy if it has one."
+    #pylint: disable=W0212
+    if isinstance(raster, RasterElement):
+        return raster._cached_info()
+    return DataInfo(raster)
+
+# the (row, column, band) window axis stored along each array axis
+_INTERLEAVE_AXES = {Interleave.BIP:(0, 1, 2),
+                    Interleave.BSQ:(2, 0, 1),
+                    Interleave.BIL:(0, 2, 1)}
+
+# largest temporary copy made when writing an array to a raster element
+_WRITE_CHUNK_BYTES = 1 << 23
+
+# strided reads fetch the needed lines of the middle axis one at a time,
+# rather than in contiguous runs, when at least this much data would be
+# skipped between them
+_STRIDED_SKIP_BYTES = 1 << 12
 
 class _DataArrayTemp(object):
     def __init__(self, raster, fixed):
@@ -1576,54 +2227,14 @@ class _DataArrayTemp(object):
         self.fixed = fixed
 
     def __getitem__(self, key):
-        try:
-            #pylint: disable=W0612, W0621
-            import numpy
-            if _RASTER_BLOCK_TYPE is None:
-                _create_raster_block()
-        except ImportError:
-            raise NotImplementedError("numpy is not available")
-        args = None
-        nfo  = DataInfo(self.raster)
-        if self.fixed:
-            idx = self.parse_indices(key,
-                                     (nfo.bands - 1,
-                                      nfo.columns - 1,
-                                      nfo.rows - 1))
-            args = DataPointerArgs(idx[2][0], idx[2][1],
-                                  idx[1][0], idx[1][1],
-                                  idx[0][0], idx[0][1],
-                                  nfo.interleave)
-        elif nfo.interleave.value == Interleave.BIP:
-            idx = self.parse_indices(key,
-                                     (nfo.rows - 1,
-                                      nfo.columns - 1,
-                                      nfo.bands - 1))
-            args = DataPointerArgs(idx[0][0], idx[0][1],
-                                  idx[1][0], idx[1][1],
-                                  idx[2][0], idx[2][1],
-                                  nfo.interleave)
-        elif nfo.interleave.value == Interleave.BSQ:
-            idx = self.parse_indices(key,
-                                     (nfo.bands - 1,
-                                      nfo.rows - 1,
-                                      nfo.columns - 1))
-            args = DataPointerArgs(idx[1][0], idx[1][1],
-                                  idx[2][0], idx[2][1],
-                                  idx[0][0], idx[0][1],
-                                  nfo.interleave)
-        elif nfo.interleave.value == Interleave.BIL:
-            idx = self.parse_indices(key,
-                                     (nfo.rows - 1,
-                                      nfo.bands - 1,
-                                      nfo.columns - 1))
-            args = DataPointerArgs(idx[0][0], idx[0][1],
-                                  idx[2][0], idx[2][1],
-                                  idx[1][0], idx[1][1],
-                                  nfo.interleave)
-        if idx[0][2] != 1 or idx[1][2] != 1 or idx[2][2] != 1:
-            raise IndexError("Step factors other than 1 not supported")
-        return _RASTER_BLOCK_TYPE(self.raster, args)
+        block_type = _raster_block_type()
+        nfo = _data_info(self.raster)
+        rows, cols, bands = self.parse_window(key, nfo)
+        if rows[2] != 1 or cols[2] != 1 or bands[2] != 1:
+            return self.read_strided(nfo, (rows, cols, bands))
+        args = DataPointerArgs(rows[0], rows[1], cols[0], cols[1],
+                               bands[0], bands[1], nfo.interleave)
+        return block_type(self.raster, args)
 
     def __setitem__(self, key, data):
         #pylint: disable=W0212, W0612, W0621
@@ -1632,61 +2243,150 @@ class _DataArrayTemp(object):
         except ImportError:
             # numpy wrapper will not be available
             raise NotImplementedError("numpy is not available")
-        nfo  = DataInfo(self.raster)
+        nfo = _data_info(self.raster)
         if not isinstance(data, numpy.ndarray):
             raise TypeError("Invalid data type, must be "\
                             "numpy.ndarray or ctypes.c_void_p")
-        if nfo.encoding.to_numpy_type() != str(data.dtype):
+        ntype = numpy.dtype(nfo.encoding.to_numpy_type())
+        if data.dtype.kind not in "biufc" or \
+                (data.dtype.kind == "c" and ntype.kind != "c"):
             raise ValueError("Array has wrong dtype.")
 
-        args = None
-        if self.fixed:
-            idx = self.parse_indices(key,
-                                     (nfo.bands - 1,
-                                      nfo.columns - 1,
-                                      nfo.rows - 1))
-            args = DataPointerArgs(idx[2][0], idx[2][1],
-                                  idx[1][0], idx[1][1],
-                                  idx[0][0], idx[0][1],
-                                  nfo.interleave)
-        elif nfo.interleave.value == Interleave.BIP:
-            idx = self.parse_indices(key,
-                                     (nfo.rows - 1,
-                                      nfo.columns - 1,
-                                      nfo.bands - 1))
-            args = DataPointerArgs(idx[0][0], idx[0][1],
-                                  idx[1][0], idx[1][1],
-                                  idx[2][0], idx[2][1],
-                                  nfo.interleave)
-        elif nfo.interleave.value == Interleave.BSQ:
-            idx = self.parse_indices(key,
-                                     (nfo.bands - 1,
-                                      nfo.rows - 1,
-                                      nfo.columns - 1))
-            args = DataPointerArgs(idx[1][0], idx[1][1],
-                                  idx[2][0], idx[2][1],
-                                  idx[0][0], idx[0][1],
-                                  nfo.interleave)
-        elif nfo.interleave.value == Interleave.BIL:
-            idx = self.parse_indices(key,
-                                     (nfo.rows - 1,
-                                      nfo.bands - 1,
-                                      nfo.columns - 1))
-            args = DataPointerArgs(idx[0][0], idx[0][1],
-                                  idx[2][0], idx[2][1],
-                                  idx[1][0], idx[1][1],
-                                  nfo.interleave)
-        if idx[0][2] != 1 or idx[1][2] != 1 or idx[2][2] != 1:
+        rows, cols, bands = self.parse_window(key, nfo)
+        if rows[2] != 1 or cols[2] != 1 or bands[2] != 1:
             raise IndexError("Step factors other than 1 not supported")
-        required_size = ((args.row_end - args.row_start + 1) *
-                         (args.column_end - args.column_start + 1) *
-                         (args.band_end - args.band_start + 1))
+        axes = _INTERLEAVE_AXES[nfo.interleave.value]
+        ranges = [(rows, cols, bands)[axis][:2] for axis in axes]
+        shape = tuple([end - start + 1 for start, end in ranges])
+        required_size = shape[0] * shape[1] * shape[2]
         if required_size != data.size:
             raise ValueError("Array has %s items, but must " \
                              "have %s items" % (data.size, required_size))
+        try:
+            # a view in the raster's interleave, if no copy is needed
+            view = data.view()
+            view.shape = shape
+        except AttributeError:
+            view = data.reshape(shape)
+        for bounds, piece in self.write_chunks(view, ranges, axes):
+            if piece.dtype != ntype or not piece.flags.c_contiguous:
+                piece = numpy.array(piece, dtype=ntype, order='C')
+            args = DataPointerArgs(bounds[0][0], bounds[0][1],
+                                   bounds[1][0], bounds[1][1],
+                                   bounds[2][0], bounds[2][1],
+                                   nfo.interleave)
+            RasterElement._copyDataToRasterElement(
+                self.raster, args, piece.ctypes.data_as(ctypes.c_void_p))
+            del piece
+        if isinstance(self.raster, RasterElement):
+            self.raster.invalidate_statistics()
 
-        rawdata = data.ctypes.data_as(ctypes.c_void_p)
-        RasterElement._copyDataToRasterElement(self.raster, args, rawdata)
+    @staticmethod
+    def write_chunks(view, ranges, axes):
+        """Split a write of view, shaped in the raster's interleave, into
+        pieces of at most _WRITE_CHUNK_BYTES bytes where possible. ranges
+        holds the inclusive (start, end) raster window along each axis of
+        view and axes is the raster's entry in _INTERLEAVE_AXES. Yields
+        ((rows, columns, bands) bounds, piece) pairs.
+
+        """
+        line = view.shape[2] * view.dtype.itemsize
+        planes = max(_WRITE_CHUNK_BYTES / max(line * view.shape[1], 1), 1)
+        lines = max(_WRITE_CHUNK_BYTES / max(line, 1), 1)
+        for first in xrange(0, view.shape[0], planes):
+            if planes > 1 or lines >= view.shape[1]:
+                count = min(planes, view.shape[0] - first)
+                pieces = [((first, count), (0, view.shape[1]))]
+            else:
+                pieces = [((first, 1), (second, min(lines,
+                                                    view.shape[1] - second)))
+                          for second in xrange(0, view.shape[1], lines)]
+            for (first0, count0), (first1, count1) in pieces:
+                offsets = ((first0, count0), (first1, count1),
+                           (0, view.shape[2]))
+                bounds = [None, None, None]
+                for axis, (start, count) in enumerate(offsets):
+                    bounds[axes[axis]] = (ranges[axis][0] + start,
+                                          ranges[axis][0] + start + count - 1)
+                yield bounds, view[first0:first0 + count0,
+                                   first1:first1 + count1]
+
+    def parse_window(self, key, nfo):
+        """Parse an index into inclusive (start, end, step) ranges for the
+        rows, columns and bands of the raster.
+
+        """
+        if self.fixed:
+            bands, cols, rows = self.parse_indices(key,
+                                                   (nfo.bands - 1,
+                                                    nfo.columns - 1,
+                                                    nfo.rows - 1))
+        elif nfo.interleave.value == Interleave.BIP:
+            rows, cols, bands = self.parse_indices(key,
+                                                   (nfo.rows - 1,
+                                                    nfo.columns - 1,
+                                                    nfo.bands - 1))
+        elif nfo.interleave.value == Interleave.BSQ:
+            bands, rows, cols = self.parse_indices(key,
+                                                   (nfo.bands - 1,
+                                                    nfo.rows - 1,
+                                                    nfo.columns - 1))
+        elif nfo.interleave.value == Interleave.BIL:
+            rows, bands, cols = self.parse_indices(key,
+                                                   (nfo.rows - 1,
+                                                    nfo.bands - 1,
+                                                    nfo.columns - 1))
+        else:
+            raise ValueError("Unknown interleave %r" % nfo.interleave)
+        for step in (rows[2], cols[2], bands[2]):
+            if step < 1:
+                raise IndexError("Negative step factors not supported")
+        return rows, cols, bands
+
+    def read_strided(self, nfo, window):
+        """Read a (rows, columns, bands) window with step factors.
+        Only the planes of the outermost axis which are needed are read,
+        so stepping over that axis skips the data entirely. Each plane is
+        read in chunks of the middle axis of at most _WRITE_CHUNK_BYTES
+        bytes, one data pointer per chunk, and the steps along the two
+        inner axes are applied while copying. When the lines skipped by a
+        step along the middle axis hold at least _STRIDED_SKIP_BYTES each
+        chunk is a single needed line instead. The result is a copy in the
+        raster's interleave.
+
+        """
+        #pylint: disable=W0201, W0621
+        import numpy
+        block_type = _raster_block_type()
+        axes = _INTERLEAVE_AXES[nfo.interleave.value]
+        ranges = [window[axis] for axis in axes]
+        shape = [(end - start) / step + 1 for start, end, step in ranges]
+        out = numpy.empty(shape, dtype=nfo.encoding.to_numpy_type())
+        step1, step2 = ranges[1][2], ranges[2][2]
+        line = (ranges[2][1] - ranges[2][0] + 1) * nfo.encoding_size
+        if (step1 - 1) * line >= _STRIDED_SKIP_BYTES:
+            per_chunk = 1
+        else:
+            per_chunk = max(_WRITE_CHUNK_BYTES / max(line * step1, 1), 1)
+        for out0, idx0 in enumerate(xrange(ranges[0][0], ranges[0][1] + 1,
+                                           ranges[0][2])):
+            for out1 in xrange(0, shape[1], per_chunk):
+                count = min(per_chunk, shape[1] - out1)
+                first = ranges[1][0] + out1 * step1
+                bounds = [None, None, None]
+                bounds[axes[0]] = (idx0, idx0)
+                bounds[axes[1]] = (first, first + (count - 1) * step1)
+                bounds[axes[2]] = ranges[2][:2]
+                args = DataPointerArgs(bounds[0][0], bounds[0][1],
+                                       bounds[1][0], bounds[1][1],
+                                       bounds[2][0], bounds[2][1],
+                                       nfo.interleave)
+                block = block_type(self.raster, args)
+                out[out0, out1:out1 + count] = block[0, ::step1, ::step2]
+                del block
+        out = out.view(block_type)
+        out.interleave = nfo.interleave
+        return out
 
     @staticmethod
     def parse_indices(key, dims):
@@ -1729,20 +2429,387 @@ class _DataArrayTemp(object):
 
         return key_t
 
+def _cpu_count():
+    "Return the number of processors, or 1 if it can not be determined."
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except (ImportError, NotImplementedError):
+        return 1
+
+def _run_tile_pool(raster, func, tiles, workers, ordered, consume,
+                   read=None):
+    """Call func on the block of each (tile, window) pair of raster using a
+    pool of worker threads. If read is specified, func is called with
+    read(window) instead of the block.
+    Blocks are read and released on the calling thread and each result
+    is passed to consume(tile, window, result), also on the calling
+    thread, so all Simple API calls stay on the calling thread. If
+    ordered is True the results are consumed in tile order. At most two
+    tiles per worker are in progress at once. The first exception raised
+    by func or consume stops the pool and is re-raised.
+
+    """
+    #pylint: disable=R0912, R0913, R0914
+    import Queue
+    block_type = _raster_block_type()
+    if read is None:
+        read = lambda window: block_type(raster, window)
+    if workers is None:
+        workers = _cpu_count()
+    if workers < 1:
+        raise ValueError("At least one worker is required")
+    tasks, results = Queue.Queue(), Queue.Queue()
+    def work():
+        # A task is [index, tile, window, block, result, error]. Workers
+        # keep no reference to a task once it is finished so the block is
+        # always released by the calling thread.
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            try:
+                task[4] = func(task[3])
+            except Exception:
+                task[5] = sys.exc_info()
+                sys.exc_clear()
+            index = task[0]
+            del task
+            results.put(index)
+    threads = [threading.Thread(target=work) for idx in xrange(workers)]
+    for thread in threads:
+        thread.setDaemon(True)
+        thread.start()
+    tiles = iter(tiles)
+    running, pending, next_index, submitted = {}, {}, 0, 0
+    error, exhausted = None, False
+    try:
+        while True:
+            while not exhausted and error is None and \
+                    len(running) + len(pending) < 2 * workers:
+                try:
+                    tile, window = tiles.next()
+                except StopIteration:
+                    exhausted = True
+                    break
+                running[submitted] = [submitted, tile, window, read(window),
+                                      None, None]
+                tasks.put(running[submitted])
+                submitted += 1
+            if not running:
+                break
+            index, tile, window, block, result, err = \
+                running.pop(results.get())
+            del block
+            if error is not None:
+                continue
+            if err is not None:
+                error = err
+            elif not ordered:
+                consume(tile, window, result)
+            else:
+                pending[index] = (tile, window, result)
+                while next_index in pending:
+                    apply(consume, pending.pop(next_index))
+                    next_index += 1
+    finally:
+        for thread in threads:
+            tasks.put(None)
+        for thread in threads:
+            thread.join()
+    if error is not None:
+        raise error[0], error[1], error[2]
+
+def _tile_result(result, tile, window, interleave):
+    """Convert a tile result to a (rows, columns, bands) array.
+    result is a 2-d (rows, columns) array or a 3-d array in interleave
+    covering window. The part outside tile is dropped.
+
+    """
+    import numpy
+    result = numpy.asarray(result)
+    if result.ndim == 2:
+        result = result[:, :, numpy.newaxis]
+    elif result.ndim == 3:
+        # reorder to (rows, columns, bands)
+        axes = _INTERLEAVE_AXES[interleave.value]
+        result = result.transpose([list(axes).index(axis)
+                                   for axis in xrange(3)])
+    else:
+        raise ValueError("Tile results must be 2-d or 3-d arrays")
+    rows = window.row_end - window.row_start + 1
+    cols = window.column_end - window.column_start + 1
+    if result.shape[:2] != (rows, cols):
+        raise ValueError("Tile result has %i rows and %i columns, but must "
+                         "have %i rows and %i columns" %
+                         (result.shape[0], result.shape[1], rows, cols))
+    brow = tile.row_start - window.row_start
+    bcol = tile.column_start - window.column_start
+    return result[brow:brow + tile.row_end - tile.row_start + 1,
+                  bcol:bcol + tile.column_end - tile.column_start + 1]
+
+def _aoi_mask_reader(aoi, rows, columns):
+    """Fetch the mask of the part of aoi inside a raster of rows by
+    columns pixels as a single block. Returns a function which gives the
+    (rows, columns) boolean array of the pixels in a window which are
+    selected in aoi.
+
+    """
+    import numpy
+    min_column, min_row, max_column, max_row = aoi.minimal_bounding_box
+    min_column, min_row = max(min_column, 0), max(min_row, 0)
+    max_column, max_row = min(max_column, columns - 1), min(max_row, rows - 1)
+    block = None
+    if min_column <= max_column and min_row <= max_row:
+        block = aoi.get_mask(min_column, min_row, max_column, max_row)
+    def window_mask(window):
+        mask = numpy.zeros((window.row_end - window.row_start + 1,
+                            window.column_end - window.column_start + 1),
+                           dtype=bool)
+        first_row = max(window.row_start, min_row)
+        last_row = min(window.row_end, max_row)
+        first_column = max(window.column_start, min_column)
+        last_column = min(window.column_end, max_column)
+        if block is not None and first_row <= last_row and \
+                first_column <= last_column:
+            mask[first_row - window.row_start:last_row - window.row_start + 1,
+                 first_column - window.column_start:
+                 last_column - window.column_start + 1] = \
+                block[first_row - min_row:last_row - min_row + 1,
+                      first_column - min_column:last_column - min_column + 1]
+        return mask
+    return window_mask
+
+def _aoi_tiles(aoi, tiles):
+    "Drop the (tile, window) pairs which are outside the bounds of aoi."
+    min_column, min_row, max_column, max_row = aoi.minimal_bounding_box
+    for tile, window in tiles:
+        if (tile.row_end >= min_row and tile.row_start <= max_row and
+                tile.column_end >= min_column and
+                tile.column_start <= max_column):
+            yield tile, window
+
+def _valid_pixels(data, mask, bad_values):
+    """Get a boolean array which is True where data is not one of
+    bad_values, is finite and, if mask is not None, mask is True. mask
+    must broadcast to the shape of data.
+
+    """
+    import numpy
+    if data.dtype.kind in "fc":
+        valid = numpy.isfinite(data)
+    else:
+        valid = numpy.ones(data.shape, dtype=bool)
+    if mask is not None:
+        valid &= mask
+    for value in bad_values:
+        valid &= data != value
+    return valid
+
+def _merge_moments(first, second):
+    """Merge two (count, mean, m2) partials, where m2 is the sum of
+    squared differences from the mean, without loss of precision. If
+    the means are vectors m2 is the matrix of summed products of the
+    differences.
+
+    """
+    import numpy
+    count = first[0] + second[0]
+    if first[0] == 0 or second[0] == 0:
+        return first[0] and first or second
+    delta = second[1] - first[1]
+    mean = first[1] + delta * second[0] / count
+    m2 = first[2] + second[2] + (numpy.multiply.outer(delta, delta) *
+                                 (float(first[0]) * second[0] / count))
+    return count, mean, m2
+
+# elements along each side of the cubes copied by _blocked_copy()
+_COPY_BLOCK = 32
+
+def _blocked_copy(dest, src):
+    """Copy the 3-d array src into dest in cubes small enough to stay in
+    the processor cache. src is usually a transposed view, which a single
+    assignment walks with a large stride on either the read or the write
+    side.
+
+    """
+    if dest.strides == src.strides or min(dest.shape) == 0:
+        dest[...] = src
+        return
+    for first in xrange(0, dest.shape[0], _COPY_BLOCK):
+        for second in xrange(0, dest.shape[1], _COPY_BLOCK):
+            for third in xrange(0, dest.shape[2], _COPY_BLOCK):
+                idx = (slice(first, first + _COPY_BLOCK),
+                       slice(second, second + _COPY_BLOCK),
+                       slice(third, third + _COPY_BLOCK))
+                dest[idx] = src[idx]
+
+# ENVI "data type" codes of the types Opticks can represent
+_ENVI_DATA_TYPES = {1:"uint8", 2:"int16", 3:"int32", 4:"float32",
+                    5:"float64", 6:"complex64", 12:"uint16", 13:"uint32"}
+
+_ENVI_INTERLEAVES = {"bsq":Interleave.BSQ, "bil":Interleave.BIL,
+                     "bip":Interleave.BIP}
+
+def _envi_header_path(path):
+    "Find the ENVI header of the data file path, or return None."
+    for header in (path + ".hdr", os.path.splitext(path)[0] + ".hdr"):
+        if os.path.isfile(header):
+            return header
+    return None
+
+def _read_envi_header(path):
+    """Parse an ENVI header into a dictionary of string values keyed by
+    lower case field names. Braces are removed from values in braces.
+
+    """
+    hdr = open(path)
+    try:
+        text = hdr.read()
+    finally:
+        hdr.close()
+    if not text.lstrip().startswith("ENVI"):
+        raise ValueError("%s is not an ENVI header" % path)
+    fields = {}
+    for match in re.finditer(r"^\s*([^=\n]+?)\s*=\s*(\{[^}]*\}|[^\n]*)",
+                             text, re.M):
+        value = match.group(2).strip()
+        if value.startswith("{"):
+            value = value[1:-1].strip()
+        fields[match.group(1).lower()] = value
+    return fields
+
+def _envi_layout(fields):
+    """Get the array shape, numpy dtype, interleave value and data offset
+    described by the fields of an ENVI header.
+
+    """
+    import numpy
+    rows, cols = int(fields["lines"]), int(fields["samples"])
+    bands = int(fields.get("bands", 1))
+    code = int(fields["data type"])
+    if code not in _ENVI_DATA_TYPES:
+        raise ValueError("ENVI data type %i can't be represented in Opticks"
+                         % code)
+    dtype = numpy.dtype(_ENVI_DATA_TYPES[code])
+    dtype = dtype.newbyteorder(int(fields.get("byte order", 0)) and ">" or "<")
+    name = fields.get("interleave", "bsq").lower()
+    if name not in _ENVI_INTERLEAVES:
+        raise ValueError("Unknown ENVI interleave %s" % name)
+    interleave = _ENVI_INTERLEAVES[name]
+    size = (rows, cols, bands)
+    shape = tuple([size[axis] for axis in _INTERLEAVE_AXES[interleave]])
+    return shape, dtype, interleave, int(fields.get("header offset", 0))
+
+def _write_envi_header(path, shape, dtype, interleave, description):
+    """Write an ENVI header for data of numpy shape and dtype stored in
+    interleave, an Interleave value.
+
+    """
+    import numpy
+    dtype = numpy.dtype(dtype)
+    codes = dict([(name, code) for code, name in _ENVI_DATA_TYPES.items()])
+    if dtype.name not in codes:
+        raise ValueError("%s can't be stored in an ENVI file" % dtype.name)
+    size = [None, None, None]
+    for axis, length in zip(_INTERLEAVE_AXES[interleave], shape):
+        size[axis] = length
+    big_endian = dtype.byteorder == ">" or \
+                 (dtype.byteorder == "=" and sys.byteorder == "big")
+    hdr = open(path, "w")
+    try:
+        hdr.write("ENVI\n")
+        hdr.write("description = {%s}\n" % description)
+        hdr.write("samples = %i\n" % size[1])
+        hdr.write("lines = %i\n" % size[0])
+        hdr.write("bands = %i\n" % size[2])
+        hdr.write("header offset = 0\n")
+        hdr.write("file type = ENVI Standard\n")
+        hdr.write("data type = %i\n" % codes[dtype.name])
+        hdr.write("interleave = %s\n" % Interleave._names[interleave].lower())
+        hdr.write("byte order = %i\n" % int(big_endian))
+    finally:
+        hdr.close()
+
+class BandStatistics(object):
+    """Statistics of one band of a RasterElement.
+    See RasterElement.compute_statistics().
+
+    """
+    #pylint: disable=R0902, R0913
+    def __init__(self, band, count, minimum, maximum, mean, variance,
+                 histogram_counts, bin_edges):
+        self.band = band
+        self.count = count
+        self.min = minimum
+        self.max = maximum
+        self.mean = mean
+        self.variance = variance
+        self.histogram_counts = histogram_counts
+        self.bin_edges = bin_edges
+
+    @property
+    def std_dev(self):
+        return self.variance ** 0.5
+
+    @property
+    def histogram_centers(self):
+        if self.bin_edges is None:
+            return None
+        return (self.bin_edges[:-1] + self.bin_edges[1:]) / 2.0
+
+    def percentile(self, percent):
+        """Estimate the value below which percent of the pixels lie by
+        interpolating within the histogram. Raises ValueError if there
+        is no histogram.
+
+        """
+        import numpy
+        if self.histogram_counts is None:
+            raise ValueError("No histogram was computed for band %i" %
+                             self.band)
+        if self.count == 0:
+            return float("nan")
+        cumulative = numpy.cumsum(self.histogram_counts)
+        target = self.count * min(max(percent, 0.0), 100.0) / 100.0
+        idx = min(int(numpy.searchsorted(cumulative, target)),
+                  len(cumulative) - 1)
+        below = idx and cumulative[idx - 1] or 0
+        fraction = 0.0
+        if self.histogram_counts[idx]:
+            fraction = float(target - below) / self.histogram_counts[idx]
+        low, high = self.bin_edges[idx], self.bin_edges[idx + 1]
+        return float(low + (high - low) * fraction)
+
+    def __repr__(self):
+        return ("<BandStatistics: band %i, %i pixels, %g-%g>" %
+                (self.band, self.count, self.min, self.max))
+
+# results of RasterElement.compute_statistics() for whole elements keyed
+# on the element handle, so every wrapper of an element shares them
+_STATISTICS = {}
+
 class RasterElement(DataElement):
     "A raster element."
+    __info = None
+    __data_info = None
     _createDataPointer = \
         _genwrap("createDataPointer", ctypes.c_void_p, DataElement,
                  ctypes.POINTER(DataPointerArgs),
-                 ctypes.POINTER(ctypes.c_int))
+                 ctypes.POINTER(ctypes.c_int), deferrable=False)
     _createDataAccessor = \
         _genwrap("createDataAccessor", DataAccessor, DataElement,
-                 ctypes.POINTER(DataAccessorArgs))
+                 ctypes.POINTER(DataAccessorArgs), deferrable=False)
+    _destroyDataPointer = \
+        _genwrap("destroyDataPointer", None, ctypes.c_void_p, errorCheck=False)
     _updateRasterElement = _genwrap("updateRasterElement", None, DataElement)
     _copyDataToRasterElement = \
         _genwrap("copyDataToRasterElement", ctypes.c_int,
                  DataElement, ctypes.POINTER(DataPointerArgs),
                  ctypes.c_void_p)
+    _createRasterElement = \
+        _genwrap("createRasterElement", DataElement,
+                 ctypes.c_char_p, RasterElementArgs, deferrable=False)
 
     def __init__(self, name, element=None):
         """Get a raster element.
@@ -1757,7 +2824,7 @@ class RasterElement(DataElement):
         else:
             handle = self._getDataElement(name, "RasterElement", int(0)).handle
         DataElement.__init__(self, None, wrapper=handle)
-        self.data_info = DataInfo(self)
+        self.get_info(True)
 
     @classmethod
     def create2d(cls, name, numpy_array,
@@ -1786,9 +2853,7 @@ class RasterElement(DataElement):
                 args.parent = parent
             if bad_values is not None:
                 args.bad_values = bad_values
-            tempf = _genwrap("createRasterElement", DataElement,
-                             ctypes.c_char_p, RasterElementArgs)
-            elem = tempf(name, args)
+            elem = cls._createRasterElement(name, args)
             relem = RasterElement(None, element=elem)
             relem.data_array[...] = numpy_array
             return relem
@@ -1843,9 +2908,7 @@ class RasterElement(DataElement):
                 args.parent = parent
             if bad_values is not None:
                 args.bad_values = bad_values
-            tempf = _genwrap("createRasterElement", DataElement,
-                             ctypes.c_char_p, RasterElementArgs)
-            elem = tempf(name, args)
+            elem = cls._createRasterElement(name, args)
             relem = RasterElement(None, element=elem)
             relem.data_array[...] = numpy_array
             return relem
@@ -1853,6 +2916,76 @@ class RasterElement(DataElement):
             raise ValueError("numpy_array argument is not " \
                              "an instance of numpy.ndarray")
 
+    @classmethod
+    def create_from_file(cls, name, path, shape=None, dtype=None,
+                         interleave=None, offset=None,
+                         location=ProcessingLocationPreference.ONDISK,
+                         parent=None,
+                         bad_values=None):
+        """Create a RasterElement from a raw binary, ENVI or .npy file.
+        The file is memory mapped and copied into the new element a few
+        megabytes at a time, so files larger than memory can be loaded.
+        For .npy files the shape and dtype come from the file. For other
+        files, if shape is None they come from the ENVI header next to the
+        file (path + ".hdr" or path with its extension replaced by .hdr),
+        otherwise shape and dtype describe the data after offset bytes,
+        which defaults to 0. shape is (rows, columns) for a single band or
+        a 3-d shape in interleave, which defaults to the header's interleave
+        or BIP. Data in either byte order is converted to native order.
+        The element is stored on disk unless location says otherwise.
+
+        """
+        #pylint: disable=R0912, R0913, R0914
+        try:
+            import numpy
+        except ImportError:
+            raise NotImplementedError("numpy is not available")
+        if isinstance(interleave, Interleave):
+            interleave = interleave.value
+        if path.lower().endswith(".npy"):
+            source = numpy.load(path, mmap_mode='r')
+            if shape is not None and tuple(shape) != source.shape:
+                raise ValueError("%s has shape %s" % (path, source.shape))
+        else:
+            if shape is None:
+                header = _envi_header_path(path)
+                if header is None:
+                    raise ValueError("shape and dtype are required for files "
+                                     "without an ENVI header")
+                shape, dtype, file_interleave, file_offset = \
+                    _envi_layout(_read_envi_header(header))
+                if interleave is None:
+                    interleave = file_interleave
+                if offset is None:
+                    offset = file_offset
+            elif dtype is None:
+                raise ValueError("dtype is required when shape is specified")
+            source = numpy.memmap(path, dtype=dtype, mode='r',
+                                  offset=offset or 0, shape=tuple(shape))
+        if source.ndim == 2:
+            interleave = Interleave.BSQ
+            size = source.shape + (1, )
+        elif source.ndim == 3:
+            if interleave is None:
+                interleave = Interleave.BIP
+            size = [None, None, None]
+            for axis, length in zip(_INTERLEAVE_AXES[interleave],
+                                    source.shape):
+                size[axis] = length
+        else:
+            raise ValueError("shape must have 2 or 3 dimensions")
+        relem = cls.create3d_empty(name, size[0], size[1], size[2],
+                                   interleave,
+                                   Encoding.from_numpy_type(source.dtype),
+                                   location, parent, bad_values)
+        try:
+            relem.data_array[...] = source
+        except:
+            relem.destroy()
+            raise
+        del source
+        return relem
+
     @classmethod
     def create3d_empty(cls, name, rows, columns, bands,
                        interleave=Interleave.BIP,
@@ -1869,38 +3002,68 @@ class RasterElement(DataElement):
             args.parent = parent
         if bad_values is not None:
             args.bad_values = bad_values
-        tempf = _genwrap("createRasterElement", DataElement,
-                         ctypes.c_char_p, RasterElementArgs)
-        elem = tempf(name, args)
+        elem = cls._createRasterElement(name, args)
         return RasterElement(None, element=elem)
 
-    @property
-    def info(self):
-        return self.data_info
+    def _cached_info(self, refresh=False):
+        """Get the read-only DataInfo shared by all slicing and data access
+        on this object. It is fetched once, and again if refresh is True
+        or after invalidate_info() has been called.
+
+        """
+        if refresh or self.__info is None:
+            info = DataInfo(self)
+            info._freeze()
+            self.__info = info
+            self.__data_info = None
+        return self.__info
+
+    def get_info(self, refresh=False):
+        """Get the DataInfo for this element.
+        This is a copy of the cached DataInfo which may be changed without
+        affecting data access. The same copy is returned until refresh is
+        True or invalidate_info() or update() is called.
+
+        """
+        info = self._cached_info(refresh)
+        if self.__data_info is None:
+            self.__data_info = info._copy()
+        return self.__data_info
+
+    def __set_data_info(self, info):
+        self.__data_info = info
+
+    def invalidate_info(self):
+        "Discard the cached DataInfo. It is fetched again on next use."
+        self.__info = None
+        self.__data_info = None
+
+    info = property(get_info)
+    data_info = property(get_info, __set_data_info)
 
     @property
     def rows(self):
-        return self.data_info.rows
+        return _data_info(self).rows
 
     @property
     def columns(self):
-        return self.data_info.columns
+        return _data_info(self).columns
 
     @property
     def bands(self):
-        return self.data_info.bands
+        return _data_info(self).bands
 
     @property
     def interleave(self):
-        return self.data_info.interleave
+        return _data_info(self).interleave
 
     @property
     def encoding(self):
-        return self.data_info.encoding
+        return _data_info(self).encoding
 
     @property
     def encoding_size(self):
-        return self.data_info.encoding_size
+        return _data_info(self).encoding_size
 
     def get_data_accessor(self, interleave=None,
                           bband=None, eband=None,
@@ -1912,7 +3075,7 @@ class RasterElement(DataElement):
                           crows=None):
         "Create a DataAccessor for this raster element."
         #pylint: disable=R0912, R0913, R0914, R0915
-        nfo = DataInfo(self)
+        nfo = _data_info(self)
         if (interleave is None and bband is None and eband is None and
             bcol is None and ecol is None and brow is None and erow is None and
             write == False and cbands is None and ccols is None and
@@ -1921,7 +3084,12 @@ class RasterElement(DataElement):
             acc._DataAccessor__owns = True
             acc._DataAccessor__encoding = nfo.encoding.to_ctype()
             col_count, writable = nfo.columns, False
-            acc.initialize(True, nfo.encoding.to_ctype(), col_count, writable)
+            args = DataAccessorArgs(0, nfo.rows - 1, 0,
+                                    0, nfo.columns - 1, 0,
+                                    0, nfo.bands - 1, 0,
+                                    nfo.interleave, writable)
+            acc.initialize(True, nfo.encoding.to_ctype(), col_count, writable,
+                           args)
             return acc
         if interleave is None:
             interleave = nfo.interleave
@@ -1982,11 +3150,13 @@ class RasterElement(DataElement):
         acc._DataAccessor__encoding = nfo.encoding.to_ctype()
         acc.initialize(True, nfo.encoding.to_ctype(),
                        args.column_end - args.column_start + 1,
-                       args.writable)
+                       args.writable, args, self.handle)
         return acc
 
     def update(self):
         self._updateRasterElement(self)
+        self.invalidate_info()
+        self.invalidate_statistics()
 
     def get_data_pointer(self, brow=None, erow=None,
                          bcol=None, ecol=None,
@@ -2003,7 +3173,7 @@ class RasterElement(DataElement):
 
         """
         #pylint: disable=R0912, R0913, R0914, R0915
-        nfo = DataInfo(self)
+        nfo = _data_info(self)
         if interleave is None:
             interleave = nfo.interleave
         if bband is None:
@@ -2052,22 +3222,643 @@ class RasterElement(DataElement):
                                  interleave)
         own, deleter = ctypes.c_int(0), None
         ptr = self._createDataPointer(self, args, ctypes.byref(own))
-        func = ctypes.pythonapi.PyBuffer_FromMemory
-        func.restype = ctypes.py_object
         datalen = ((erow - brow + 1) * (ecol - bcol + 1) *
                    (eband - bband + 1) * nfo.encoding_size)
-        dbuffer = func(ptr, datalen)
+        dbuffer = _buffer_from_memory(ptr, datalen)
         if own:
             class DeleterObj(object):
                 def __init__(self, ptr):
                     self.__ptr = ptr
                 def __del__(self):
-                    tempf = _genwrap("destroyDataPointer", None,
-                                     ctypes.c_void_p, errorCheck=False)
-                    tempf(self.__ptr)
+                    RasterElement._destroyDataPointer(self.__ptr)
             deleter = DeleterObj(ptr)
         return dbuffer, deleter
 
+    def band_range(self, bands=None):
+        """Convert a band selection to an inclusive (first, last) pair.
+        bands may be None for all bands, a single band number or an
+        inclusive (first, last) pair. Negative band numbers count from
+        the last band.
+
+        """
+        nfo = _data_info(self)
+        if bands is None:
+            return 0, nfo.bands - 1
+        if isinstance(bands, (int, long)):
+            bands = (bands, bands)
+        first, last = bands
+        if first < 0:
+            first += nfo.bands
+        if last < 0:
+            last += nfo.bands
+        if not 0 <= first <= last < nfo.bands:
+            raise IndexError("Invalid band range %s" % (tuple(bands), ))
+        return first, last
+
+    def tile_windows(self, tile_rows, tile_cols, bands=None, overlap=0,
+                     interleave=None):
+        """Generate (tile, window) pairs of DataPointerArgs covering this
+        element in row major order.
+        Tiles are tile_rows by tile_cols pixels, smaller along the last
+        row and column, and do not overlap. Each window is its tile grown
+        by overlap pixels on every side and clipped to the element.
+        bands is passed to band_range(). The windows request data in
+        interleave, which defaults to this element's interleave.
+
+        """
+        nfo = _data_info(self)
+        if tile_rows < 1 or tile_cols < 1:
+            raise ValueError("Tile size must be at least one pixel")
+        if overlap < 0:
+            raise ValueError("Overlap can not be negative")
+        bband, eband = self.band_range(bands)
+        if interleave is None:
+            interleave = nfo.interleave
+        def do_iter(nfo, bband, eband):
+            for brow in xrange(0, nfo.rows, tile_rows):
+                erow = min(brow + tile_rows, nfo.rows) - 1
+                for bcol in xrange(0, nfo.columns, tile_cols):
+                    ecol = min(bcol + tile_cols, nfo.columns) - 1
+                    tile = DataPointerArgs(brow, erow, bcol, ecol,
+                                           bband, eband, interleave)
+                    window = DataPointerArgs(max(brow - overlap, 0),
+                                             min(erow + overlap, nfo.rows - 1),
+                                             max(bcol - overlap, 0),
+                                             min(ecol + overlap,
+                                                 nfo.columns - 1),
+                                             bband, eband, interleave)
+                    yield tile, window
+        return do_iter(nfo, bband, eband)
+
+    def iter_tiles(self, tile_rows, tile_cols, bands=None, overlap=0,
+                   interleave=None):
+        """Iterate over this element in tiles.
+        Yields (window, RasterBlock) pairs where window is the
+        DataPointerArgs of the data in the block. See tile_windows() for
+        the arguments; blocks in another interleave are converted by
+        Opticks when they are read. Each block is read when it is
+        requested and no reference to it is kept, so no more than one
+        tile is held in memory unless the caller keeps them. For elements
+        stored on disk the block's copy of the data is freed when the
+        block is deleted.
+        Blocks are not read ahead on another thread: the Simple API error
+        state is shared, so createDataPointer() has to be called on the
+        thread which uses the API. Use map_tiles() to overlap the work
+        done on each block instead.
+
+        """
+        block_type = _raster_block_type()
+        def do_iter(raster, windows):
+            for window in windows:
+                yield window, block_type(raster, window)
+        return do_iter(self, (window for tile, window in
+                              self.tile_windows(tile_rows, tile_cols,
+                                                bands, overlap, interleave)))
+
+    def map_tiles(self, func, out=None, workers=None, tile_rows=256,
+                  tile_cols=256, bands=None, overlap=0, ordered=False):
+        """Apply func to this element tile by tile on a pool of threads.
+        func is called with each RasterBlock from iter_tiles() and must
+        return a numpy array with the same rows and columns, either 2-d
+        (rows, columns) or 3-d in this element's interleave, or None to
+        write nothing. The overlap is removed from each result, which is
+        written to out with copyDataToRasterElement starting at band 0.
+        out may be a RasterElement, the name of a new RasterElement or
+        None to create one named after this element. New elements have
+        this element's size and interleave, and the band count and
+        encoding of the first result. Only use this element as out when
+        overlap is 0.
+        workers defaults to the number of processors. Blocks are read and
+        results are written on the calling thread; func runs on the
+        workers so it should release the GIL (most numpy operations do).
+        If ordered is True results are written in tile order. Returns
+        out, or None if func never returned a result.
+
+        """
+        #pylint: disable=R0913
+        target = [out]
+        def write(tile, window, result):
+            self._write_tile(target, tile, window, result)
+        try:
+            _run_tile_pool(self, func,
+                           self.tile_windows(tile_rows, tile_cols, bands,
+                                             overlap),
+                           workers, ordered, write)
+        except:
+            # don't leave a partly written element behind
+            if target[0] is not out and isinstance(target[0], RasterElement):
+                target[0].destroy()
+            raise
+        if isinstance(target[0], RasterElement):
+            target[0].update()
+            return target[0]
+        return None
+
+    def map_tiles_processes(self, func, out=None, processes=None,
+                            tile_rows=256, tile_cols=256, bands=None,
+                            overlap=0, scratch_dir=None):
+        """Apply func to this element tile by tile on a pool of processes.
+        This is map_tiles() for functions which hold the GIL. func must be
+        picklable (a module level function) and must not use the Simple
+        API. It is called in a worker process with a read-only numpy array
+        in this element's interleave.
+        Tiles are not pickled. Each tile is read with get_data_pointer()
+        into a memory mapped scratch file which the worker maps, and the
+        worker stores its result in a memory mapped .npy file which is
+        written to out on the calling thread. The workers run
+        opticks_worker.process_tile() which does not import opticks, so
+        they work with any multiprocessing start method. Scratch files
+        are created in scratch_dir, or the system temporary directory,
+        and are removed when done. At most two tiles per process are in
+        progress.
+        processes defaults to the number of processors. When running inside
+        Opticks on Windows, call multiprocessing.set_executable() with the
+        path of a python interpreter first. See map_tiles() for the other
+        arguments and the return value.
+
+        """
+        #pylint: disable=R0913, R0914
+        import multiprocessing
+        import tempfile
+        import shutil
+        import opticks_worker
+        ntype = _data_info(self).encoding.to_numpy_type()
+        if processes is None:
+            processes = _cpu_count()
+        tiles = self.tile_windows(tile_rows, tile_cols, bands, overlap)
+        scratch = tempfile.mkdtemp(prefix="opticks", dir=scratch_dir)
+        pool = multiprocessing.Pool(processes)
+        target, free, running = [out], range(2 * processes), \
+                                collections.deque()
+        def finish():
+            slot, tile, window, task = running.popleft()
+            if task.get():
+                self._unstage_tile(target, tile, window,
+                                   os.path.join(scratch, "out%i.npy" % slot))
+            free.append(slot)
+        try:
+            for tile, window in tiles:
+                if not free:
+                    finish()
+                slot = free.pop()
+                in_path = os.path.join(scratch, "in%i" % slot)
+                shape = self._stage_tile(window, in_path)
+                running.append((slot, tile, window, pool.apply_async(
+                    opticks_worker.process_tile,
+                    (func, in_path, shape, ntype,
+                     os.path.join(scratch, "out%i.npy" % slot)))))
+            while running:
+                finish()
+            pool.close()
+        except:
+            pool.terminate()
+            if target[0] is not out and isinstance(target[0], RasterElement):
+                target[0].destroy()
+            raise
+        finally:
+            pool.join()
+            shutil.rmtree(scratch, True)
+        if isinstance(target[0], RasterElement):
+            target[0].update()
+            return target[0]
+        return None
+
+    def convert_interleave(self, interleave, out=None, bands=None,
+                           tile_rows=256, tile_cols=256, band_chunk=64):
+        """Copy this element into another interleave one tile at a time.
+        out may be a numpy array shaped for interleave with this element's
+        rows and columns and the selected bands, a RasterElement of the
+        same size in interleave, the name of a new RasterElement or None
+        to create one named after this element. bands is passed to
+        band_range() and the first selected band is written to band 0.
+        Tiles of tile_rows by tile_cols pixels and up to band_chunk bands
+        are read in this element's interleave and reordered in cache sized
+        blocks, so only one tile is held in memory in addition to out.
+        BSQ elements are read one band chunk at a time and others one
+        pixel tile at a time to follow their layout on disk. Returns out.
+
+        """
+        #pylint: disable=R0912, R0913, R0914
+        import numpy
+        block_type = _raster_block_type()
+        nfo = _data_info(self)
+        if isinstance(interleave, Interleave):
+            interleave = interleave.value
+        if interleave not in _INTERLEAVE_AXES:
+            raise ValueError("Unknown interleave %r" % interleave)
+        if band_chunk < 1:
+            raise ValueError("band_chunk must be at least one band")
+        bband, eband = self.band_range(bands)
+        size = (nfo.rows, nfo.columns, eband - bband + 1)
+        src_axes = _INTERLEAVE_AXES[nfo.interleave.value]
+        dest_axes = _INTERLEAVE_AXES[interleave]
+        order = [src_axes.index(axis) for axis in dest_axes]
+        if isinstance(out, numpy.ndarray):
+            shape = tuple([size[axis] for axis in dest_axes])
+            if out.shape != shape:
+                raise ValueError("Output array has shape %s but must have "
+                                 "shape %s" % (out.shape, shape))
+            ntype = out.dtype
+        else:
+            if not isinstance(out, RasterElement):
+                out = self._create_like(out, size[2],
+                                        nfo.encoding.to_numpy_type(),
+                                        Interleave(interleave),
+                                        Interleave._names[interleave])
+            dest = _data_info(out)
+            if dest.interleave.value != interleave:
+                raise ValueError("Output element has interleave %r" %
+                                 dest.interleave)
+            if (dest.rows, dest.columns) != size[:2] or dest.bands < size[2]:
+                raise ValueError("Output element is too small")
+            ntype = dest.encoding.to_numpy_type()
+        chunks = [(first, min(first + band_chunk - 1, eband))
+                  for first in xrange(bband, eband + 1, band_chunk)]
+        def windows():
+            if nfo.interleave.value == Interleave.BSQ:
+                for chunk in chunks:
+                    for tile, window in self.tile_windows(tile_rows,
+                                                          tile_cols, chunk):
+                        yield window
+            else:
+                for tile, window in self.tile_windows(tile_rows, tile_cols,
+                                                      (bband, eband)):
+                    for first, last in chunks:
+                        yield DataPointerArgs(window.row_start,
+                                              window.row_end,
+                                              window.column_start,
+                                              window.column_end,
+                                              first, last, nfo.interleave)
+        for window in windows():
+            block = block_type(self, window)
+            src = block.transpose(order)
+            bounds = (slice(window.row_start, window.row_end + 1),
+                      slice(window.column_start, window.column_end + 1),
+                      slice(window.band_start - bband,
+                            window.band_end - bband + 1))
+            if isinstance(out, numpy.ndarray):
+                _blocked_copy(out[tuple([bounds[axis] for axis in dest_axes])],
+                              src)
+            else:
+                data = numpy.empty(src.shape, dtype=ntype)
+                _blocked_copy(data, src)
+                args = DataPointerArgs(window.row_start, window.row_end,
+                                       window.column_start, window.column_end,
+                                       bounds[2].start, bounds[2].stop - 1,
+                                       interleave)
+                self._copyDataToRasterElement(
+                    out, args, data.ctypes.data_as(ctypes.c_void_p))
+                out.invalidate_statistics()
+                del data
+            del src, block
+        if isinstance(out, RasterElement):
+            out.update()
+        return out
+
+    def compute_statistics(self, bands=None, aoi=None, bins=None,
+                           hist_range=None, workers=None, tile_rows=256,
+                           tile_cols=256, refresh=False):
+        """Compute the statistics of bands of this element.
+        Returns a list of BandStatistics, one per band, with the pixel
+        count, minimum, maximum, mean, variance and a histogram of bins
+        bins, 256 if bins is None. bands is passed to band_range(). Bad
+        values, non-finite values and, if aoi is specified, pixels outside
+        the Aoi are ignored.
+        Tiles are read on the calling thread and the partial results of
+        each tile are computed on a pool of workers threads and merged.
+        The data is read once. The histogram of 8 and 16 bit integer data
+        is exact and covers hist_range, a (low, high) pair, or the range
+        of the data if hist_range is None. Other data only has a
+        histogram if hist_range is specified; otherwise histogram_counts
+        and bin_edges are None and passing bins raises ValueError.
+        Results for the whole element are cached, and shared by every
+        RasterElement wrapping it, until refresh is True, update() or
+        invalidate_statistics() is called or data is written with
+        data_array, set_data_pointer() or a writable DataAccessor.
+        Results for an aoi are not cached.
+
+        """
+        #pylint: disable=R0912, R0913, R0914, R0915
+        try:
+            import numpy
+        except ImportError:
+            raise NotImplementedError("numpy is not available")
+        nfo = _data_info(self)
+        bband, eband = self.band_range(bands)
+        ntype = numpy.dtype(nfo.encoding.to_numpy_type())
+        exact = ntype.kind in "iu" and ntype.itemsize <= 2
+        if hist_range is not None:
+            hist_range = tuple(hist_range)
+        elif bins is not None and not exact:
+            # the range of the data is not known until it has been read
+            raise ValueError("A histogram of %s data requires hist_range" %
+                             ntype.name)
+        if bins is None:
+            bins = 256
+        key = (bband, eband, bins, hist_range)
+        cached = _STATISTICS.get(self.handle)
+        if aoi is None and not refresh and cached is not None \
+                and key in cached:
+            return cached[key]
+        block_type = _raster_block_type()
+        if exact:
+            offset = int(numpy.iinfo(ntype).min)
+            values = numpy.arange(offset, int(numpy.iinfo(ntype).max) + 1)
+        axes = _INTERLEAVE_AXES[nfo.interleave.value]
+        order = [axes.index(axis) for axis in xrange(3)]
+        bad_values = nfo.bad_values
+        if aoi is not None:
+            aoi_mask = _aoi_mask_reader(aoi, nfo.rows, nfo.columns)
+        def read(window):
+            mask = None
+            if aoi is not None:
+                mask = aoi_mask(window)
+            return block_type(self, window), mask
+        tiles = self.tile_windows(tile_rows, tile_cols, (bband, eband))
+        if aoi is not None:
+            tiles = _aoi_tiles(aoi, tiles)
+        def band_values(item):
+            block, mask = item
+            data = block.transpose(order)
+            for band in xrange(data.shape[2]):
+                plane = data[:, :, band]
+                yield plane[_valid_pixels(plane, mask, bad_values)]
+        def moments(item):
+            partials = []
+            for band in band_values(item):
+                if not band.size:
+                    partials.append(None)
+                    continue
+                mean = band.mean(dtype=numpy.float64)
+                deviation = numpy.subtract(band, mean, dtype=numpy.float64)
+                partial = [band.min(), band.max(),
+                           (band.size, mean, numpy.dot(deviation, deviation))]
+                if exact:
+                    partial.append(numpy.bincount(band.astype(int) - offset,
+                                                  minlength=values.size))
+                elif hist_range is not None:
+                    partial.append(numpy.histogram(band, bins,
+                                                   hist_range)[0])
+                partials.append(partial)
+            return partials
+        count = eband - bband + 1
+        totals = [None] * count
+        def merge(tile, window, partials):
+            for band, partial in enumerate(partials):
+                total = totals[band]
+                if partial is None:
+                    continue
+                if total is None:
+                    totals[band] = partial
+                    continue
+                total[0] = min(total[0], partial[0])
+                total[1] = max(total[1], partial[1])
+                total[2] = _merge_moments(total[2], partial[2])
+                if len(total) > 3:
+                    total[3] += partial[3]
+        _run_tile_pool(self, moments, tiles, workers, True, merge, read)
+        result = []
+        for band, total in enumerate(totals):
+            if total is None:
+                nan = float("nan")
+                hist_counts, edges = None, None
+                if exact or hist_range is not None:
+                    hist_counts = numpy.zeros(bins, dtype=numpy.int64)
+                    edges = numpy.linspace(0.0, 1.0, bins + 1)
+                result.append(BandStatistics(bband + band, 0, nan, nan, nan,
+                                             nan, hist_counts, edges))
+                continue
+            minimum, maximum = total[0], total[1]
+            pixels, mean, m2 = total[2]
+            if len(total) > 3:
+                hist_counts = total[3]
+            else:
+                hist_counts = numpy.zeros(bins, dtype=numpy.int64)
+            if exact:
+                hist_counts, edges = numpy.histogram(
+                    values, bins, hist_range or (minimum, maximum),
+                    weights=hist_counts)
+                hist_counts = hist_counts.astype(numpy.int64)
+            elif hist_range is not None:
+                edges = numpy.histogram([], bins, hist_range)[1]
+            else:
+                hist_counts, edges = None, None
+            result.append(BandStatistics(bband + band, int(pixels),
+                                         minimum.item(), maximum.item(),
+                                         float(mean), float(m2 / pixels),
+                                         hist_counts, edges))
+        if aoi is None:
+            _STATISTICS.setdefault(self.handle, {})[key] = result
+        return result
+
+    def spectral_covariance(self, aoi=None, step=1, bands=None, workers=1,
+                            tile_rows=256, tile_cols=256):
+        """Compute the mean spectrum and band covariance matrix.
+        Returns a (mean, covariance) pair of float64 arrays. The
+        covariance is normalized by the pixel count minus one. Every
+        step'th row and column is used, pixels with a bad or non-finite
+        value in any band are skipped and, if aoi is specified, so are
+        pixels outside the Aoi. bands is passed to band_range().
+        The sums are accumulated in float64 as merged partial means and
+        sums of products of differences from them, a few thousand pixels
+        at a time, which is stable for large cubes with large offsets.
+        With one worker a single tile is held in memory; more workers
+        compute partials on a thread pool as in map_tiles().
+
+        """
+        #pylint: disable=R0913, R0914
+        try:
+            import numpy
+        except ImportError:
+            raise NotImplementedError("numpy is not available")
+        if step < 1:
+            raise ValueError("step must be at least 1")
+        block_type = _raster_block_type()
+        nfo = _data_info(self)
+        bband, eband = self.band_range(bands)
+        count = eband - bband + 1
+        axes = _INTERLEAVE_AXES[nfo.interleave.value]
+        order = [axes.index(axis) for axis in xrange(3)]
+        bad_values = nfo.bad_values
+        # pixels per partial, keeping the float64 copy to about 8 MB
+        chunk = max(_WRITE_CHUNK_BYTES / (8 * count), 1)
+        if aoi is not None:
+            aoi_mask = _aoi_mask_reader(aoi, nfo.rows, nfo.columns)
+        def read(window):
+            mask = None
+            if aoi is not None:
+                mask = aoi_mask(window)
+            return window, block_type(self, window), mask
+        def moments(item):
+            window, block, mask = item
+            rows = slice((-window.row_start) % step, None, step)
+            cols = slice((-window.column_start) % step, None, step)
+            data = block.transpose(order)[rows, cols]
+            if mask is not None:
+                mask = mask[rows, cols, numpy.newaxis]
+            valid = _valid_pixels(data, mask, bad_values).all(axis=2)
+            pixels = data[valid]
+            total = (0, None, None)
+            for start in xrange(0, len(pixels), chunk):
+                part = numpy.array(pixels[start:start + chunk],
+                                   dtype=numpy.float64)
+                mean = part.mean(axis=0)
+                part -= mean
+                total = _merge_moments(total, (len(part), mean,
+                                               numpy.dot(part.T, part)))
+            return total
+        result = [(0, None, None)]
+        def merge(tile, window, partial):
+            result[0] = _merge_moments(result[0], partial)
+        tiles = self.tile_windows(tile_rows, tile_cols, (bband, eband))
+        if aoi is not None:
+            tiles = _aoi_tiles(aoi, tiles)
+        if workers == 1:
+            for tile, window in tiles:
+                merge(tile, window, moments(read(window)))
+        else:
+            _run_tile_pool(self, moments, tiles, workers, True, merge, read)
+        pixels, mean, m2 = result[0]
+        if pixels < 2:
+            raise ValueError("At least two valid pixels are required")
+        return mean, m2 / (pixels - 1)
+
+    def invalidate_statistics(self):
+        "Discard the statistics cached by compute_statistics()."
+        _STATISTICS.pop(self.handle, None)
+
+    def export(self, path, interleave=None, bands=None, header=True,
+               tile_rows=256, tile_cols=256):
+        """Write this element to a .npy file or a raw binary file.
+        The output file is created at its full size and memory mapped,
+        and the data is copied into it one tile at a time with
+        convert_interleave(), so the element is never held in memory.
+        The file is written in interleave, which defaults to this
+        element's interleave; a .npy file holds an array in that layout.
+        For raw files an ENVI header is written next to the file, with
+        the file's extension replaced by .hdr, unless header is False.
+        bands is passed to band_range().
+
+        """
+        #pylint: disable=R0913
+        try:
+            import numpy
+        except ImportError:
+            raise NotImplementedError("numpy is not available")
+        nfo = _data_info(self)
+        if interleave is None:
+            interleave = nfo.interleave
+        if isinstance(interleave, Interleave):
+            interleave = interleave.value
+        if interleave not in _INTERLEAVE_AXES:
+            raise ValueError("Unknown interleave %r" % interleave)
+        bband, eband = self.band_range(bands)
+        size = (nfo.rows, nfo.columns, eband - bband + 1)
+        shape = tuple([size[axis] for axis in _INTERLEAVE_AXES[interleave]])
+        dtype = numpy.dtype(nfo.encoding.to_numpy_type())
+        if path.lower().endswith(".npy"):
+            out = numpy.lib.format.open_memmap(path, mode='w+', dtype=dtype,
+                                               shape=shape)
+        else:
+            if header:
+                _write_envi_header(os.path.splitext(path)[0] + ".hdr",
+                                   shape, dtype, interleave,
+                                   "Exported from %s" % self.name)
+            out = numpy.memmap(path, dtype=dtype, mode='w+', shape=shape)
+        try:
+            self.convert_interleave(interleave, out, (bband, eband),
+                                    tile_rows, tile_cols)
+            out.flush()
+        finally:
+            del out
+
+    def _write_tile(self, target, tile, window, result):
+        """Write a tile result from func in map_tiles() to target[0],
+        creating the element first if target[0] is not a RasterElement.
+
+        """
+        import numpy
+        if result is None:
+            return
+        data = _tile_result(result, tile, window, self.interleave)
+        if not isinstance(target[0], RasterElement):
+            target[0] = self._create_like(target[0], data.shape[2], data.dtype)
+        dest = _data_info(target[0])
+        args = DataPointerArgs(tile.row_start, tile.row_end,
+                               tile.column_start, tile.column_end,
+                               0, data.shape[2] - 1, dest.interleave)
+        data = numpy.ascontiguousarray(
+            data.transpose(_INTERLEAVE_AXES[dest.interleave.value]),
+            dtype=dest.encoding.to_numpy_type())
+        self._copyDataToRasterElement(target[0], args,
+                                      data.ctypes.data_as(ctypes.c_void_p))
+        target[0].invalidate_statistics()
+
+    def _stage_tile(self, window, path):
+        """Copy window of this element to a new memory mapped scratch file
+        at path in this element's interleave for map_tiles_processes().
+        Returns the shape of the data in the file.
+
+        """
+        import numpy
+        nfo = _data_info(self)
+        ntype = nfo.encoding.to_numpy_type()
+        bounds = ((window.row_start, window.row_end),
+                  (window.column_start, window.column_end),
+                  (window.band_start, window.band_end))
+        shape = tuple([bounds[axis][1] - bounds[axis][0] + 1
+                       for axis in _INTERLEAVE_AXES[nfo.interleave.value]])
+        data, deleter = self.get_data_pointer(
+            window.row_start, window.row_end,
+            window.column_start, window.column_end,
+            window.band_start, window.band_end, nfo.interleave)
+        mapped = numpy.memmap(path, dtype=ntype, mode='w+', shape=shape)
+        mapped[...] = numpy.frombuffer(data, ntype).reshape(shape)
+        mapped.flush()
+        del mapped, data, deleter
+        return shape
+
+    def _unstage_tile(self, target, tile, window, path):
+        """Write the result a map_tiles_processes() worker stored in the
+        .npy file at path to target[0] like _write_tile().
+
+        """
+        import numpy
+        result = numpy.load(path, mmap_mode='r')
+        self._write_tile(target, tile, window, result)
+        del result
+
+    def _create_like(self, name, bands, dtype, interleave=None,
+                     suffix="map"):
+        """Create a new RasterElement with the size of this element and
+        interleave, which defaults to this element's interleave. If name
+        is None a unique name made from this element's name and suffix
+        is used.
+
+        """
+        try:
+            import numpy
+        except ImportError:
+            raise NotImplementedError("numpy is not available")
+        # accept scalar types such as numpy.float32 as well as dtypes
+        encoding = Encoding.from_numpy_type(numpy.dtype(dtype))
+        if interleave is None:
+            interleave = self.interleave
+        if name is not None:
+            return RasterElement.create3d_empty(name, self.rows, self.columns,
+                                                bands, interleave, encoding)
+        base, count = "%s %s" % (self.name, suffix), 1
+        while True:
+            name = count > 1 and "%s %i" % (base, count) or base
+            try:
+                return RasterElement.create3d_empty(name, self.rows,
+                                                    self.columns, bands,
+                                                    interleave, encoding)
+            except SimpleApiError, err:
+                if err.code != SimpleApiError.SIMPLE_EXISTS:
+                    raise
+            count += 1
+
     @property
     def data_array(self):
         return _DataArrayTemp(self, False)
@@ -2086,7 +3877,7 @@ class RasterElement(DataElement):
 
         """
         #pylint: disable=R0912, R0913, R0914, R0915
-        nfo = DataInfo(self)
+        nfo = _data_info(self)
         if interleave is None:
             interleave = nfo.interleave
         if bband is None:
@@ -2152,6 +3943,178 @@ class RasterElement(DataElement):
         else:
             data_void_p = data
         self._copyDataToRasterElement(self, args, data_void_p)
+        self.invalidate_statistics()
+
+# functions available to bandmath() expressions
+_BANDMATH_FUNCTIONS = ("abs", "sqrt", "exp", "log", "log10", "sin", "cos",
+                       "tan", "arcsin", "arccos", "arctan", "arctan2",
+                       "where", "minimum", "maximum", "clip")
+
+# the bandmath() functions which numexpr also provides
+_NUMEXPR_FUNCTIONS = ("abs", "sqrt", "exp", "log", "log10", "sin", "cos",
+                      "tan", "arcsin", "arccos", "arctan", "arctan2",
+                      "where")
+
+def _parse_bandmath(expr):
+    """Check that expr only contains band references, numbers, arithmetic,
+    comparisons and calls to _BANDMATH_FUNCTIONS. Returns the sorted band
+    numbers and the set of function names used.
+
+    """
+    import _ast
+    try:
+        tree = compile(expr, "<bandmath>", "eval", _ast.PyCF_ONLY_AST)
+    except SyntaxError, err:
+        raise ValueError("Invalid expression: %s" % err)
+    allowed = (_ast.Expression, _ast.BinOp, _ast.UnaryOp, _ast.Compare,
+               _ast.Num, _ast.Load, _ast.operator, _ast.unaryop, _ast.cmpop)
+    bands, names = set(), set()
+    def visit(node):
+        if isinstance(node, _ast.Subscript):
+            index = node.slice
+            if not (isinstance(node.value, _ast.Name) and
+                    node.value.id == "b" and
+                    isinstance(index, _ast.Index) and
+                    isinstance(index.value, _ast.Num) and
+                    isinstance(index.value.n, (int, long))):
+                raise ValueError("Bands must be referenced as b[number]")
+            bands.add(index.value.n)
+            return
+        if isinstance(node, _ast.Call):
+            if not isinstance(node.func, _ast.Name) or node.keywords or \
+                    node.starargs is not None or node.kwargs is not None:
+                raise ValueError("Only simple function calls are allowed")
+            if node.func.id not in _BANDMATH_FUNCTIONS:
+                raise ValueError("Unknown function %s" % node.func.id)
+            names.add(node.func.id)
+            for arg in node.args:
+                visit(arg)
+            return
+        if isinstance(node, _ast.Name):
+            raise ValueError("Unknown name %s" % node.id)
+        if not isinstance(node, allowed):
+            raise ValueError("%s is not allowed in band math" %
+                             node.__class__.__name__)
+        for field in node._fields:
+            value = getattr(node, field)
+            if not isinstance(value, list):
+                value = [value]
+            for child in value:
+                if isinstance(child, _ast.AST):
+                    visit(child)
+    visit(tree)
+    return sorted(bands), names
+
+def bandmath(expr, raster, out_name=None, dtype="float32", workers=None,
+             tile_rows=256, tile_cols=256):
+    """Evaluate a band math expression over a RasterElement.
+    Bands are referenced as b[band] with zero based band numbers, for
+    example "(b[4] - b[3]) / (b[4] + b[3])". Expressions may contain
+    numbers, arithmetic and comparison operators and calls to abs, sqrt,
+    exp, log, log10, the trigonometric functions, where, minimum, maximum
+    and clip. The expression is parsed once. Each tile reads only the
+    referenced bands, with one data pointer per run of consecutive bands,
+    converts them to dtype and evaluates the expression, using numexpr
+    if it is installed to avoid full size temporaries. Pixels where a
+    referenced band holds a bad value are set to NaN in floating point
+    results.
+    The result is written to a new single band RasterElement named
+    out_name, or named after raster if out_name is None, which is
+    returned. Tiles are evaluated on a pool of workers threads as in
+    RasterElement.map_tiles().
+
+    """
+    #pylint: disable=R0913, R0914, W0123
+    try:
+        import numpy
+    except ImportError:
+        raise NotImplementedError("numpy is not available")
+    bands, names = _parse_bandmath(expr)
+    if not bands:
+        raise ValueError("The expression does not reference any bands")
+    nfo = _data_info(raster)
+    for band in bands:
+        if not 0 <= band < nfo.bands:
+            raise IndexError("Band %i does not exist" % band)
+    runs = []
+    for band in bands:
+        if runs and band == runs[-1][1] + 1:
+            runs[-1][1] = band
+        else:
+            runs.append([band, band])
+    dtype = numpy.dtype(dtype)
+    block_type = _raster_block_type()
+    axes = _INTERLEAVE_AXES[nfo.interleave.value]
+    order = [axes.index(axis) for axis in xrange(3)]
+    bad_values = nfo.bad_values
+    evaluate = None
+    try:
+        import numexpr
+        if names.issubset(_NUMEXPR_FUNCTIONS):
+            source = re.sub(r"\bb\s*\[\s*(\d+)\s*\]", r"b\1", expr)
+            def evaluate(data):
+                local_dict = dict([("b%i" % band, value)
+                                   for band, value in data.items()])
+                return numexpr.evaluate(source, local_dict=local_dict)
+    except ImportError:
+        pass
+    if evaluate is None:
+        code = compile(expr, "<bandmath>", "eval")
+        functions = dict([(name, getattr(numpy, name))
+                          for name in _BANDMATH_FUNCTIONS])
+        def evaluate(data):
+            namespace = dict(functions)
+            namespace["b"] = data
+            return eval(code, {"__builtins__":{}}, namespace)
+    def read(window):
+        return [block_type(raster,
+                           DataPointerArgs(window.row_start, window.row_end,
+                                           window.column_start,
+                                           window.column_end,
+                                           first, last, nfo.interleave))
+                for first, last in runs]
+    def calculate(blocks):
+        data, valid = {}, None
+        for (first, last), block in zip(runs, blocks):
+            view = block.transpose(order)
+            for band in xrange(first, last + 1):
+                plane = view[:, :, band - first]
+                if bad_values:
+                    plane_valid = _valid_pixels(plane, None, bad_values)
+                    if valid is None:
+                        valid = plane_valid
+                    else:
+                        valid &= plane_valid
+                data[band] = plane.astype(dtype)
+        errors = numpy.seterr(all="ignore")
+        try:
+            value = evaluate(data)
+        finally:
+            numpy.seterr(**errors)
+        result = numpy.empty(plane.shape, dtype=dtype)
+        result[...] = value
+        if valid is not None and dtype.kind in "fc":
+            result[~valid] = numpy.nan
+        return result
+    out = raster._create_like(out_name, 1, dtype, Interleave(Interleave.BSQ),
+                              "bandmath")
+    interleave = _data_info(out).interleave
+    def write(tile, window, result):
+        #pylint: disable=W0212
+        args = DataPointerArgs(tile.row_start, tile.row_end,
+                               tile.column_start, tile.column_end,
+                               0, 0, interleave)
+        raster._copyDataToRasterElement(
+            out, args, result.ctypes.data_as(ctypes.c_void_p))
+    try:
+        _run_tile_pool(raster, calculate,
+                       raster.tile_windows(tile_rows, tile_cols, bands[0]),
+                       workers, False, write, read)
+    except:
+        out.destroy()
+        raise
+    out.update()
+    return out
 
 class Signature(DataElement):
     "A signature data type."
@@ -2216,13 +4179,34 @@ class Signature(DataElement):
     def __delitem__(self, key):
         raise NotImplementedError()
 
+    def spectrum(self, key="Reflectance"):
+        "Get a data set of this signature as a float64 numpy array."
+        try:
+            import numpy
+        except ImportError:
+            raise NotImplementedError("numpy is not available")
+        return numpy.array(self[key].get_value(as_numpy=True),
+                           dtype=numpy.float64).ravel()
+
+    def match(self, raster, method="sam", out_name=None, bands=None,
+              key="Reflectance", background=None, workers=None,
+              tile_rows=256, tile_cols=256):
+        """Score every pixel of raster against this signature.
+        See SignatureSet.match().
+
+        """
+        #pylint: disable=R0913
+        return _match_spectra(self.spectrum(key)[None, :], raster, method,
+                              out_name, bands, background, workers,
+                              tile_rows, tile_cols)
+
 class SignatureSet(DataElement):
     "A signature set data type."
     _getSignatureSetCount = \
         _genwrap("getSignatureSetCount", ctypes.c_uint32, DataElement)
     _getSignatureSetSignature = \
         _genwrap("getSignatureSetSignature", DataElement,
-                 DataElement, ctypes.c_uint32)
+                 DataElement, ctypes.c_uint32, deferrable=False)
 
     def __init__(self, name, element=None):
         """Get a signature set.
@@ -2261,6 +4245,127 @@ class SignatureSet(DataElement):
             raise IndexError()
         return Signature(element=self._getSignatureSetSignature(self, index))
 
+    def spectra(self, key="Reflectance"):
+        """Get a data set of every signature in this set as the rows of a
+        float64 numpy matrix.
+
+        """
+        try:
+            import numpy
+        except ImportError:
+            raise NotImplementedError("numpy is not available")
+        spectra = [self[index].spectrum(key) for index in xrange(len(self))]
+        if not spectra:
+            raise ValueError("The signature set is empty")
+        if len(set([len(spectrum) for spectrum in spectra])) != 1:
+            raise ValueError("The signatures have different lengths")
+        return numpy.vstack(spectra)
+
+    def match(self, raster, method="sam", out_name=None, bands=None,
+              key="Reflectance", background=None, workers=None,
+              tile_rows=256, tile_cols=256):
+        """Score every pixel of raster against each signature in this set.
+        Returns a new float32 RasterElement, named out_name or after
+        raster and method, with one band of scores per signature. The
+        key data set of each signature is read once into a matrix and
+        must have one value for each of the selected bands (see
+        RasterElement.band_range()); no resampling is done.
+        method is one of
+          "sam" the spectral angle in radians, smaller is a better match
+          "mf" the matched filter, 1 for a pixel equal to the signature
+          "ace" the adaptive cosine estimator, between 0 and 1
+        "mf" and "ace" use background, a (mean, covariance) pair such as
+        the result of RasterElement.spectral_covariance(), which is
+        computed over the selected bands if background is None.
+        raster is read tile by tile and each tile is scored on a pool of
+        workers threads with one matrix product against all signatures
+        ("ace" needs a second product for the background term). Pixels
+        with a bad or non-finite value in any band are NaN.
+
+        """
+        #pylint: disable=R0913
+        return _match_spectra(self.spectra(key), raster, method, out_name,
+                              bands, background, workers, tile_rows,
+                              tile_cols)
+
+def _match_spectra(spectra, raster, method, out_name, bands, background,
+                   workers, tile_rows, tile_cols):
+    """Implementation of SignatureSet.match() for a (signatures, bands)
+    matrix of spectra.
+
+    """
+    #pylint: disable=R0913, R0914
+    import numpy
+    method = method.lower()
+    if method not in ("sam", "mf", "ace"):
+        raise ValueError("Unknown match method %s" % method)
+    nfo = _data_info(raster)
+    bband, eband = raster.band_range(bands)
+    count = eband - bband + 1
+    if spectra.shape[1] != count:
+        raise ValueError("The signatures have %i values but %i bands are "
+                         "used" % (spectra.shape[1], count))
+    inverse = offset = None
+    if method == "sam":
+        lengths = numpy.sqrt((spectra * spectra).sum(axis=1))
+        if not lengths.all():
+            raise ValueError("Signatures for the spectral angle can not "
+                             "be zero")
+        weights = (spectra / lengths[:, numpy.newaxis]).T
+    else:
+        if background is None:
+            background = raster.spectral_covariance(bands=(bband, eband),
+                                                    workers=workers)
+        offset, covariance = background
+        offset = numpy.asarray(offset, dtype=numpy.float64)
+        inverse = numpy.linalg.pinv(covariance)
+        targets = (spectra - offset).T
+        projected = numpy.dot(inverse, targets)
+        energy = (targets * projected).sum(axis=0)
+        if method == "mf":
+            weights = projected / energy
+        else:
+            weights = projected / numpy.sqrt(energy)
+    axes = _INTERLEAVE_AXES[nfo.interleave.value]
+    order = [axes.index(axis) for axis in xrange(3)]
+    bad_values = nfo.bad_values
+    def calculate(block):
+        data = block.transpose(order)
+        shape = data.shape[:2] + (len(spectra), )
+        pixels = numpy.array(data, dtype=numpy.float64).reshape(-1, count)
+        valid = _valid_pixels(pixels, None, bad_values).all(axis=1)
+        errors = numpy.seterr(all="ignore")
+        try:
+            if offset is not None:
+                pixels -= offset
+            scores = numpy.dot(pixels, weights)
+            if method == "sam":
+                scores /= numpy.sqrt((pixels * pixels).sum(axis=1))[:, None]
+                numpy.arccos(numpy.clip(scores, -1.0, 1.0, scores), scores)
+            elif method == "ace":
+                scores *= scores
+                scores /= (numpy.dot(pixels, inverse) *
+                           pixels).sum(axis=1)[:, None]
+        finally:
+            numpy.seterr(**errors)
+        scores[~valid] = numpy.nan
+        # _write_tile() expects blocks in the raster's interleave
+        return scores.astype(numpy.float32).reshape(shape).transpose(axes)
+    target = [raster._create_like(out_name, len(spectra), numpy.float32,
+                                  None, method)]
+    def write(tile, window, result):
+        raster._write_tile(target, tile, window, result)
+    try:
+        _run_tile_pool(raster, calculate,
+                       raster.tile_windows(tile_rows, tile_cols,
+                                           (bband, eband)),
+                       workers, False, write)
+    except:
+        target[0].destroy()
+        raise
+    target[0].update()
+    return target[0]
+
 # important IEEE-754 contant
 NAN = 1e30000/1e30000 # overflow to cause Inf then divide to cause NaN
 
@@ -2289,14 +4394,12 @@ class Layer(ctypes.Structure):
             assert(name is None and typ is None and isinstance(other, Layer))
             self.handle = other.handle
         else:
-            tempf = _genwrap("getLayer", Layer, ctypes.c_char_p,
-                             ctypes.c_char_p)
-            self.handle = tempf(name, typ).handle
+            self.handle = self._getLayer(name, typ).handle
         self.__owns = False
 
     def __del__(self):
         if self.__owns:
-            _genwrap("destroyLayer", None, Layer, errorCheck=False)(self)
+            self._destroyLayer(self)
 
     def destroy(self, val=True):
         """Mark this layer for destruction. When the layer object
@@ -2423,9 +4526,8 @@ class View(ctypes.Structure):
         """
         ctypes.Structure.__init__(self)
         if wrapper is None:
-            tempf = _genwrap("getView", View, ctypes.c_char_p, ctypes.c_char_p)
             typ = "SpatialDataView"
-            self.handle = tempf(name, typ).handle
+            self.handle = self._getView(name, typ).handle
         else:
             self.handle = wrapper
         self.__owns = False
@@ -2438,14 +4540,12 @@ class View(ctypes.Structure):
 
         """
         typ = "Spatial Data View"
-        tempf = _genwrap("createView", View, ctypes.c_char_p,
-                         ctypes.c_char_p, DataElement)
-        newv = View(wrapper=tempf(name, typ, element).handle)
+        newv = View(wrapper=cls._createView(name, typ, element).handle)
         return newv
 
     def __del__(self):
         if self.__owns:
-            _genwrap("destroyView", None, View, errorCheck=False)(self)
+            self._destroyView(self)
 
     def destroy(self, val=True):
         """Mark this view for destruction. When the view object
@@ -2475,19 +4575,15 @@ class View(ctypes.Structure):
         will be name. If name is None, the name of the element will be used.
 
         """
-        tempf = _genwrap("createLayer", Layer, View,
-                         DataElement, ctypes.c_char_p, ctypes.c_char_p)
-        layer = tempf(self, element, typ, name)
+        layer = self._createLayer(self, element, typ, name)
         return layer.leafclass()
 
     def iter_layers(self):
         def do_iter(view):
-            get_view_layer = _genwrap("getViewLayer", Layer,
-                                      View, ctypes.c_uint32)
             idx = 0
             while True:
                 try:
-                    layer = get_view_layer(view, idx)
+                    layer = view._getViewLayer(view, idx)
                     yield layer.leafclass()
                 except SimpleApiError, err:
                     if err.code == SimpleApiError.SIMPLE_NOT_FOUND:
@@ -2497,6 +4593,18 @@ class View(ctypes.Structure):
                     idx += 1
         return do_iter(self)
 
+View._getView = \
+    _genwrap("getView", View, ctypes.c_char_p, ctypes.c_char_p,
+             deferrable=False)
+View._createView = \
+    _genwrap("createView", View, ctypes.c_char_p, ctypes.c_char_p,
+             DataElement, deferrable=False)
+View._destroyView = _genwrap("destroyView", None, View, errorCheck=False)
+View._createLayer = \
+    _genwrap("createLayer", Layer, View, DataElement, ctypes.c_char_p,
+             ctypes.c_char_p)
+View._getViewLayer = \
+    _genwrap("getViewLayer", Layer, View, ctypes.c_uint32, deferrable=False)
 View._getViewName = \
     _genwrap("getViewName", ctypes.c_uint32, View, ctypes.c_char_p,
              ctypes.c_uint32)
@@ -2507,6 +4615,13 @@ View._getViewType = \
              ctypes.c_uint32)
 View._getViewPrimaryRasterElement = \
     _genwrap("getViewPrimaryRasterElement", DataElement, View)
+Layer._getLayer = \
+    _genwrap("getLayer", Layer, ctypes.c_char_p, ctypes.c_char_p,
+             deferrable=False)
+Layer._destroyLayer = _genwrap("destroyLayer", None, Layer, errorCheck=False)
+Layer._createRasterLayer = \
+    _genwrap("createLayer", Layer, View, RasterElement, ctypes.c_char_p,
+             ctypes.c_char_p)
 Layer._getLayerName = \
     _genwrap("getLayerName", ctypes.c_uint32, Layer, ctypes.c_char_p,
              ctypes.c_uint32)
@@ -2535,7 +4650,8 @@ Layer._setLayerDisplayIndex = \
 Layer._deriveLayer = \
     _genwrap("deriveLayer", Layer, Layer, ctypes.c_char_p,
              ctypes.c_char_p)
-Layer._convertLayer = _genwrap("convertLayer", Layer, Layer, ctypes.c_char_p)
+Layer._convertLayer = \
+    _genwrap("convertLayer", Layer, Layer, ctypes.c_char_p, deferrable=False)
 Layer._isLayerActive = _genwrap("isLayerActive", ctypes.c_int, Layer)
 Layer._activateLayer = _genwrap("activateLayer", ctypes.c_int, Layer)
 
@@ -2546,17 +4662,12 @@ class PassArea(ctypes.c_uint32):
     MIDDLE = 2
     OUTSIDE = 3
 
+    _names = {LOWER:"Below 1st threshold", UPPER:"Above 1st threshold",
+              MIDDLE:"Between 1st and 2nd thresholds",
+              OUTSIDE:"Outside 1st and 2nd thresholds"}
+
     def __repr__(self):
-        strname = "Unknown"
-        if self.value == self.LOWER:
-            strname = "Below 1st threshold"
-        elif self.value == self.UPPER:
-            strname = "Above 1st threshold"
-        elif self.value == self.MIDDLE:
-            strname = "Between 1st and 2nd thresholds"
-        elif self.value == self.OUTSIDE:
-            strname = "Outside 1st and 2nd thresholds"
-        return "<PassArea: %s>" % strname
+        return "<PassArea: %s>" % self._names.get(self.value, "Unknown")
 
 class RegionUnits(ctypes.c_uint32):
     "Opticks RegionUnitsEnum type."
@@ -2565,17 +4676,11 @@ class RegionUnits(ctypes.c_uint32):
     PERCENTILE = 2
     STD_DEV = 3
 
+    _names = {RAW_VALUE:"Raw value", PERCENTAGE:"Percentage",
+              PERCENTILE:"Percentile", STD_DEV:"Standard deviation"}
+
     def __repr__(self):
-        strname = "Unknown"
-        if self.value == self.RAW_VALUE:
-            strname = "Raw value"
-        elif self.value == self.PERCENTAGE:
-            strname = "Percentage"
-        elif self.value == self.PERCENTILE:
-            strname = "Percentile"
-        elif self.value == self.STD_DEV:
-            strname = "Standard deviation"
-        return "<RegionUnits: %s>" % strname
+        return "<RegionUnits: %s>" % self._names.get(self.value, "Unknown")
 
 class Stretch(ctypes.c_uint32):
     "Opticks StretchTypeEnum type."
@@ -2584,17 +4689,11 @@ class Stretch(ctypes.c_uint32):
     EXPONENTIAL = 2
     EQUALIZE = 3
 
+    _names = {LINEAR:"Linear", LOGARITHMIC:"Logarithmic",
+              EXPONENTIAL:"Exponential", EQUALIZE:"Histogram Equalization"}
+
     def __repr__(self):
-        strname = "Unknown"
-        if self.value == self.LINEAR:
-            strname = "Linear"
-        elif self.value == self.LOGARITHMIC:
-            strname = "Logarithmic"
-        elif self.value == self.EXPONENTIAL:
-            strname = "Exponential"
-        elif self.value == self.EQUALIZE:
-            strname = "Histogram Equalization"
-        return "<Stretch: %s>" % strname
+        return "<Stretch: %s>" % self._names.get(self.value, "Unknown")
 
 class Color(object):
     "Opticks Color type"
@@ -2661,17 +4760,11 @@ class RasterChannel(ctypes.c_uint32):
     GREEN = 2
     BLUE = 3
 
+    _names = {GRAY:"gray/colormap/indexed", RED:"red", GREEN:"green",
+              BLUE:"blue"}
+
     def __repr__(self):
-        strname = "Unknown"
-        if self.value == self.GRAY:
-            strname = "gray/colormap/indexed"
-        elif self.value == self.RED:
-            strname = "red"
-        elif self.value == self.GREEN:
-            strname = "green"
-        elif self.value == self.BLUE:
-            strname = "blue"
-        return "<RasterChannel: %s>" % strname
+        return "<RasterChannel: %s>" % self._names.get(self.value, "Unknown")
 
 class ComplexComponent(ctypes.c_uint32):
     "Opticks ComplexComponentEnum type."
@@ -2680,17 +4773,11 @@ class ComplexComponent(ctypes.c_uint32):
     INPHASE = 2
     QUADRATURE = 3
 
+    _names = {MAGNITUDE:"magnitude", PHASE:"phase", INPHASE:"in-phase",
+              QUADRATURE:"quadrature"}
+
     def __repr__(self):
-        strname = "Unknown"
-        if self.value == self.MAGNITUDE:
-            strname = "magnitude"
-        elif self.value == self.PHASE:
-            strname = "phase"
-        elif self.value == self.INPHASE:
-            strname = "in-phase"
-        elif self.value == self.QUADRATURE:
-            strname = "quadrature"
-        return "<ComplexComponent: %s>" % strname
+        return "<ComplexComponent: %s>" % self._names.get(self.value, "Unknown")
 
 class ThresholdLayer(Layer):
     "A Threshold layer."
@@ -2726,9 +4813,7 @@ class ThresholdLayer(Layer):
     def create(cls, name, element, view=None):
         if view is None:
             view = View()
-        tempf = _genwrap("createLayer", Layer, View,
-                         RasterElement, ctypes.c_char_p, ctypes.c_char_p)
-        layer = tempf(view, element, "ThresholdLayer", name)
+        layer = cls._createRasterLayer(view, element, "ThresholdLayer", name)
         return layer.leafclass()
 
     @classmethod
@@ -2737,15 +4822,11 @@ class ThresholdLayer(Layer):
 
     def get_info(self):
         info = ThresholdLayer.Info()
-        tempf = _genwrap('getThresholdLayerInfo', ctypes.c_int,
-                         Layer, ctypes.POINTER(ThresholdLayer.Info))
-        tempf(self, ctypes.byref(info))
+        self._getThresholdLayerInfo(self, ctypes.byref(info))
         return info
     def set_info(self, info):
         assert(isinstance(info, ThresholdLayer.Info))
-        tempf = _genwrap('setThresholdLayerInfo', ctypes.c_int,
-                         Layer, ctypes.POINTER(ThresholdLayer.Info))
-        tempf(self, ctypes.byref(info))
+        self._setThresholdLayerInfo(self, ctypes.byref(info))
     info = property(get_info, set_info, doc="Threshold parameters.")
 
     def get_thresholds(self):
@@ -2775,6 +4856,13 @@ class ThresholdLayer(Layer):
         self.info = info
     units = property(get_units, set_units, doc="Region units enum")
 
+ThresholdLayer._getThresholdLayerInfo = \
+    _genwrap("getThresholdLayerInfo", ctypes.c_int, Layer,
+             ctypes.POINTER(ThresholdLayer.Info))
+ThresholdLayer._setThresholdLayerInfo = \
+    _genwrap("setThresholdLayerInfo", ctypes.c_int, Layer,
+             ctypes.POINTER(ThresholdLayer.Info))
+
 class PseudocolorClass(object):
     "A pseudocolor class."
 
@@ -2876,9 +4964,7 @@ class PseudocolorLayer(Layer):
     def create(cls, name, element, view=None):
         if view is None:
             view = View()
-        tempf = _genwrap("createLayer", Layer, View,
-                         RasterElement, ctypes.c_char_p, ctypes.c_char_p)
-        layer = tempf(view, element, "PseudocolorLayer", name)
+        layer = cls._createRasterLayer(view, element, "PseudocolorLayer", name)
         return layer.leafclass()
 
     @classmethod
@@ -3053,9 +5139,7 @@ class RasterLayer(Layer):
     def create(cls, name, element, view=None):
         if view is None:
             view = View()
-        tempf = _genwrap("createLayer", Layer, View,
-                         RasterElement, ctypes.c_char_p, ctypes.c_char_p)
-        layer = tempf(view, element, "RasterLayer", name)
+        layer = cls._createRasterLayer(view, element, "RasterLayer", name)
         return layer.leafclass()
 
     @classmethod
@@ -3312,18 +5396,14 @@ class AnimationState(ctypes.c_uint32):
     PAUSE_FORWARD = 3
     PAUSE_BACKWARD = 4
 
+    _names = {STOP:"stopped", PLAY_FORWARD:"playing forward",
+              PLAY_BACKWARD:"playing backward",
+              PAUSE_FORWARD:"paused, will resume forward",
+              PAUSE_BACKWARD:"paused, will resume backward"}
+
     def __repr__(self):
-        if self.value == self.STOP:
-            return "<AnimationState: stopped>"
-        elif self.value == self.PLAY_FORWARD:
-            return "<AnimationState: playing forward>"
-        elif self.value == self.PLAY_BACKWARD:
-            return "<AnimationState: playing backward>"
-        elif self.value == self.PAUSE_FORWARD:
-            return "<AnimationState: paused, will resume forward>"
-        elif self.value == self.PAUSE_BACKWARD:
-            return "<AnimationState: paused, will resume backward>"
-        return "<AnimationState: unknown value>"
+        return ("<AnimationState: %s>" %
+                self._names.get(self.value, "unknown value"))
 
 class AnimationCycle(ctypes.c_uint32):
     "Opticks AnimationCycle type."
@@ -3331,14 +5411,11 @@ class AnimationCycle(ctypes.c_uint32):
     REPEAT = 1
     BOUNCE = 2
 
+    _names = {PLAY_ONCE:"play once", REPEAT:"repeat", BOUNCE:"bounce"}
+
     def __repr__(self):
-        if self.value == self.PLAY_ONCE:
-            return "<AnimationCycle: play once>"
-        elif self.value == self.REPEAT:
-            return "<AnimationCycle: repeat>"
-        elif self.value == self.BOUNCE:
-            return "<AnimationCycle: bounce>"
-        return "<AnimationCycle: unknown value>"
+        return ("<AnimationCycle: %s>" %
+                self._names.get(self.value, "unknown value"))
 
 animation_callback_t = ctypes.CFUNCTYPE(None, ctypes.c_char_p,
                                         ctypes.c_char_p, ctypes.c_uint32,
@@ -3355,9 +5432,7 @@ class Animation(ctypes.Structure):
         ctypes.Structure.__init__(self)
         self.__owns = False
         if wrapper is None:
-            tempf = _genwrap("getAnimationController", Animation,
-                             ctypes.c_char_p)
-            self.handle = tempf(name).handle
+            self.handle = self._getAnimationController(name).handle
         else:
             self.handle = wrapper
 
@@ -3369,9 +5444,8 @@ class Animation(ctypes.Structure):
         will be raised.
 
         """
-        tempf = _genwrap("createAnimationController", Animation,
-                          ctypes.c_char_p, ctypes.c_int)
-        newa = Animation(wrapper=tempf(name, time_based).handle)
+        newa = Animation(
+            wrapper=cls._createAnimationController(name, time_based).handle)
         return newa
 
     def __del__(self):
@@ -3470,11 +5544,8 @@ class Animation(ctypes.Structure):
                 self.__hndl = hndl
                 self.__cb_func = cb_func
             def __del__(self):
-                destroy_attachment = \
-                    _genwrap("destroyAnimationControllerAttachment", None,
-                             Animation, ctypes.c_char_p, ctypes.c_void_p,
-                             errorCheck=False)
-                destroy_attachment(self.__cntrl, self.__name, self.__hndl)
+                self.__cntrl._destroyAnimationControllerAttachment(
+                    self.__cntrl, self.__name, self.__hndl)
                 del self.__cb_func
         return DeleterObj(self, name, hndl, callback_func)
 
@@ -3487,6 +5558,14 @@ class Animation(ctypes.Structure):
     def stop(self):
         self._stopAnimationController(self)
 
+Animation._getAnimationController = \
+    _genwrap("getAnimationController", Animation, ctypes.c_char_p)
+Animation._createAnimationController = \
+    _genwrap("createAnimationController", Animation, ctypes.c_char_p,
+             ctypes.c_int)
+Animation._destroyAnimationControllerAttachment = \
+    _genwrap("destroyAnimationControllerAttachment", None, Animation,
+             ctypes.c_char_p, ctypes.c_void_p, errorCheck=False)
 Animation._destroyAnimationController = \
     _genwrap("destroyAnimationController", None, Animation, errorCheck=False)
 Animation._activateAnimationController = \
@@ -3622,3 +5701,12 @@ class GcpList(DataElement):
         _set_gcp_points(self, cnt, ctypes.cast(points, ctypes.POINTER(Gcp)))
 
     points = property(get_gcps, set_gcps)
+
+import opticks.profiling
+
+# Set OPTICKS_PYTHON_EAGER_BINDINGS in the environment to resolve every
+# binding at import time and report any which are missing.
+_UNRESOLVED = []
+if os.environ.get("OPTICKS_PYTHON_EAGER_BINDINGS"):
+    _UNRESOLVED = resolve_bindings()
+_IMPORT_TIME = _timer() - _IMPORT_START
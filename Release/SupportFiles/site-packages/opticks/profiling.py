@@ -0,0 +1,190 @@
+"""Per function profiling of Simple API calls.
+
+Profiling is off by default. When enabled every function created with
+opticks._genwrap() records the number of calls, the total and maximum
+wall time, a sample of recent call times for percentiles and the number
+of calls which raised a SimpleApiError.
+
+    import opticks.profiling
+    with opticks.profiling.profile(top=10):
+        run_my_script()
+
+"""
+import sys
+import threading
+from timeit import default_timer as _timer
+import opticks
+
+__copyright__ = """The information in this file is
+ Copyright(c) 2009 Ball Aerospace & Technologies Corporation
+ and is subject to the terms and conditions of the
+ GNU Lesser General Public License Version 2.1
+ The license text is available from
+ http://www.gnu.org/licenses/lgpl.html"""
+
+_SAMPLE_COUNT = 1024
+_LOCK = threading.Lock()
+_STATS = {}
+_ENABLED = False
+
+class CallStats(object):
+    "Accumulated timing for a single Simple API function."
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.__samples = []
+        self.__next = 0
+
+    def add(self, elapsed, failed):
+        "Record one call. Only the most recent calls are kept as samples."
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        if failed:
+            self.errors += 1
+        if len(self.__samples) < _SAMPLE_COUNT:
+            self.__samples.append(elapsed)
+        else:
+            self.__samples[self.__next] = elapsed
+            self.__next = (self.__next + 1) % _SAMPLE_COUNT
+
+    def percentile(self, pct):
+        "Return the pct percentile of the sampled call times in seconds."
+        if not self.__samples:
+            return 0.0
+        samples = sorted(self.__samples)
+        index = int(round(pct / 100.0 * (len(samples) - 1)))
+        return samples[index]
+
+    def as_dict(self):
+        "Return the statistics as a plain dictionary. Times are in seconds."
+        mean = 0.0
+        if self.count:
+            mean = self.total / self.count
+        return {"count":self.count,
+                "errors":self.errors,
+                "total":self.total,
+                "max":self.max,
+                "mean":mean,
+                "p50":self.percentile(50),
+                "p90":self.percentile(90),
+                "p99":self.percentile(99)}
+
+    def __repr__(self):
+        return ("<CallStats: %s %i calls %.3f ms>" %
+                (self.name, self.count, self.total * 1000.0))
+
+def _record(name, elapsed, failed):
+    _LOCK.acquire()
+    try:
+        stats = _STATS.get(name)
+        if stats is None:
+            stats = _STATS[name] = CallStats(name)
+        stats.add(elapsed, failed)
+    finally:
+        _LOCK.release()
+
+def _instrument(name, func):
+    "Binding hook which times each call to func."
+    def wrapper(*args):
+        start, failed = _timer(), False
+        try:
+            return func(*args)
+        except opticks.SimpleApiError:
+            failed = True
+            raise
+        finally:
+            _record(name, _timer() - start, failed)
+    wrapper.__name__ = name
+    return wrapper
+
+def enable():
+    "Start recording Simple API calls."
+    #pylint: disable=W0212,W0603
+    global _ENABLED
+    _ENABLED = True
+    opticks._set_binding_hook(_instrument)
+
+def disable():
+    "Stop recording Simple API calls. Recorded statistics are kept."
+    #pylint: disable=W0212,W0603
+    global _ENABLED
+    _ENABLED = False
+    opticks._set_binding_hook(None)
+
+def is_enabled():
+    return _ENABLED
+
+def reset():
+    "Discard all recorded statistics."
+    _LOCK.acquire()
+    try:
+        _STATS.clear()
+    finally:
+        _LOCK.release()
+
+def snapshot():
+    """Return a dictionary mapping each called Simple API function name
+    to a dictionary of its statistics: count, errors, total, max, mean,
+    p50, p90 and p99. Times are in seconds.
+
+    """
+    _LOCK.acquire()
+    try:
+        return dict([(name, stats.as_dict())
+                     for name, stats in _STATS.items()])
+    finally:
+        _LOCK.release()
+
+def report(top=20, stream=None, sort="total"):
+    """Write a table of the top Simple API functions to stream
+    (sys.stdout by default). Rows are ordered by the sort statistic
+    which may be any key returned by snapshot().
+
+    """
+    if stream is None:
+        stream = sys.stdout
+    rows = snapshot().items()
+    rows.sort(key=lambda item: item[1][sort], reverse=True)
+    stream.write("%-40s %9s %10s %9s %9s %9s %6s\n" %
+                 ("function", "calls", "total ms", "max ms",
+                  "p50 us", "p99 us", "errors"))
+    for name, stats in rows[:top]:
+        stream.write("%-40s %9i %10.2f %9.3f %9.1f %9.1f %6i\n" %
+                     (name[:40], stats["count"], stats["total"] * 1e3,
+                      stats["max"] * 1e3, stats["p50"] * 1e6,
+                      stats["p99"] * 1e6, stats["errors"]))
+
+class _ProfileScope(object):
+    "Scope object created by profile()."
+
+    def __init__(self, top, stream, sort, clear):
+        self.top, self.stream, self.sort = top, stream, sort
+        self.clear = clear
+        self.__was_enabled = False
+
+    def __enter__(self):
+        self.__was_enabled = is_enabled()
+        if self.clear:
+            reset()
+        enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.__was_enabled:
+            disable()
+        report(self.top, self.stream, self.sort)
+        return False
+
+def profile(top=20, stream=None, sort="total", clear=True):
+    """Return a context manager which records Simple API calls made inside
+    the scope and writes the top entries with report() when it exits.
+    Statistics are reset on entry unless clear is False.
+
+    """
+    return _ProfileScope(top, stream, sort, clear)
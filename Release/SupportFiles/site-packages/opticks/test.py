@@ -1,3 +1,4 @@
+from __future__ import with_statement
 import unittest
 import opticks
 import ctypes
@@ -35,6 +36,87 @@ class ErrorsTestCase(unittest.TestCase):
         self.assertEqual(opticks.SimpleApiError._get_last_error(),
                          opticks.SimpleApiError.SIMPLE_WRONG_TYPE)
 
+class DeferredErrorsTestCase(unittest.TestCase):
+    def tearDown(self):
+        opticks.SimpleApiError._set_last_error(
+            opticks.SimpleApiError.SIMPLE_NO_ERROR)
+
+    def test_deferred_check(self):
+        def do_deferred():
+            with opticks.deferred_errors():
+                opticks.DataVariant._createDataVariantFromString("int",
+                                                                 "bad value",
+                                                                 1)
+        try:
+            do_deferred()
+            self.fail("Expected SimpleApiError when leaving the scope")
+        except opticks.SimpleApiError, err:
+            self.failUnlessEqual(err.function, "createDataVariantFromString")
+
+    def test_failure_not_masked(self):
+        def do_deferred():
+            with opticks.deferred_errors():
+                opticks.DataVariant._createDataVariantFromString("int",
+                                                                 "bad value",
+                                                                 1)
+                opticks.DataVariant(5)
+        try:
+            do_deferred()
+            self.fail("Expected SimpleApiError from the failing call")
+        except opticks.SimpleApiError, err:
+            self.failUnlessEqual(err.function, "createDataVariantFromString")
+
+    def test_void_failure_not_masked(self):
+        def do_deferred():
+            with opticks.deferred_errors():
+                # setMetadataAttributeByPath returns nothing so its
+                # failure must be raised before the next call succeeds
+                opticks.DynamicObject._setMetadataAttributeByPath(
+                    opticks.DynamicObject(0), "a", opticks.DataVariant(5))
+                opticks.DataVariant(5)
+        try:
+            do_deferred()
+            self.fail("Expected SimpleApiError from the failing call")
+        except opticks.SimpleApiError, err:
+            self.failUnlessEqual(err.function, "setMetadataAttributeByPath")
+
+    def test_no_error(self):
+        with opticks.deferred_errors(check_every=2) as scope:
+            for value in range(5):
+                opticks.DataVariant(value)
+        self.failUnless(scope.calls > 0)
+
+class BindingTestCase(unittest.TestCase):
+    def test_binding_reuse(self):
+        first = opticks._genwrap("getLastError", ctypes.c_int,
+                                 errorCheck=False)
+        second = opticks._genwrap("getLastError", ctypes.c_int,
+                                  errorCheck=False)
+        self.failUnless(first is second)
+        checked = opticks._genwrap("getLastError", ctypes.c_int)
+        self.failIf(first is checked)
+
+    def test_resolve_bindings(self):
+        self.failUnlessEqual(opticks.resolve_bindings(), [])
+        self.failUnless(opticks.startup_report().startswith("opticks"))
+
+class ProfilingTestCase(unittest.TestCase):
+    def tearDown(self):
+        opticks.profiling.disable()
+        opticks.profiling.reset()
+
+    def test_snapshot(self):
+        import StringIO
+        stream = StringIO.StringIO()
+        with opticks.profiling.profile(top=5, stream=stream):
+            for value in range(3):
+                opticks.DataVariant(value)
+        stats = opticks.profiling.snapshot()
+        self.failUnlessEqual(stats["createDataVariant"]["count"], 3)
+        self.failUnlessEqual(stats["createDataVariant"]["errors"], 0)
+        self.failUnless("createDataVariant" in stream.getvalue())
+        self.failIf(opticks.profiling.is_enabled())
+
 class AnimationTestCase(unittest.TestCase):
     def setUp(self):
         self.failUnless(load_test_file("ir_bushehr_06jun02_ps.tif"))
@@ -134,6 +216,30 @@ class DataVariantTestCase(unittest.TestCase):
         self.failUnlessEqual(dvar.dv_type, "float")
         self.failIfEqual(dvar.value, val)
 
+class TypeRegistryTestCase(unittest.TestCase):
+    def test_encoding(self):
+        for encoding in range(10):
+            enc = opticks.Encoding(encoding)
+            self.failIf(repr(enc).endswith("Unknown>"))
+            self.failIfEqual(enc.to_ctype(), ctypes.c_void_p)
+        self.failUnlessEqual(opticks.Encoding.from_numpy_type("float32"),
+                             opticks.Encoding.FLT4BYTES)
+        self.failUnlessRaises(TypeError, opticks.Encoding.from_numpy_type,
+                              "int64")
+
+    def test_register(self):
+        class Pair(ctypes.Structure):
+            _fields_ = [("first", ctypes.c_int), ("second", ctypes.c_int)]
+        opticks.register_type("TestPair", Pair)
+        try:
+            value = Pair(3, 4)
+            native = opticks._void_p_to_native("TestPair",
+                                               ctypes.addressof(value))
+            self.failUnlessEqual((native.first, native.second), (3, 4))
+        finally:
+            del opticks._TYPES_BY_NAME["TestPair"]
+            del opticks._TYPES_BY_CTYPE[Pair]
+
 class PlugInArgTestCase(unittest.TestCase):
     def setUp(self):
         self.plugin = opticks.PlugIn("Passthrough PlugIn")
@@ -297,6 +403,54 @@ class MetadataTestCase(unittest.TestCase):
         del self.meta['bcd']
         self.failUnlessEqual(len(self.meta), 0)
 
+    def test_long_key(self):
+        key = "k" * 1000
+        self.meta['short'] = 1
+        self.meta[key] = 2
+        self.failUnlessEqual(sorted(self.meta.iter_keys()),
+                             sorted([key, 'short']))
+
+    def test_to_dict(self):
+        self.meta['a/b/c'] = 10
+        self.meta['a/d'] = 2.5
+        self.meta.e = 'fgh'
+        self.failUnlessEqual(self.meta.to_dict(),
+                             {'a':{'b':{'c':10}, 'd':2.5}, 'e':'fgh'})
+        self.failUnlessEqual(self.meta.to_dict(['a/b/c', 'x/y']),
+                             {'a':{'b':{'c':10}}})
+
+    def test_update(self):
+        self.meta.update({'a':{'b':3, 'c':'def'}}, gains=[1.0, 2.0, 4.0])
+        self.failUnlessEqual(self.meta['a/b'].value, 3)
+        self.failUnlessEqual(self.meta['a/c'].value, 'def')
+        self.failUnlessEqual(self.meta.gains.dv_type, 'vector<double>')
+        self.failUnlessEqual(list(self.meta.gains.value), [1.0, 2.0, 4.0])
+        self.assertRaises(ValueError, self.meta.update, empty=[])
+        self.assertRaises(opticks.OpticksError, self.meta.update,
+                          names=["a, b", "c"])
+        try:
+            import numpy
+        except ImportError:
+            return
+        wavelengths = numpy.linspace(0.4, 2.5, 200)
+        self.meta.update(w=wavelengths)
+        self.failUnless((self.meta.to_dict()['w'] == wavelengths).all())
+        self.meta.update(scale=numpy.float64(0.5), count=numpy.int64(7))
+        self.failUnlessEqual(self.meta.scale.value, 0.5)
+        self.failUnlessEqual(self.meta.count.value, 7)
+
+    def test_vector_as_numpy(self):
+        try:
+            import numpy
+        except ImportError:
+            return
+        self.meta.update(w=numpy.arange(10, dtype=numpy.float32))
+        arr = self.meta.w.get_value(as_numpy=True)
+        self.failUnlessEqual(arr.dtype, numpy.float32)
+        self.failUnlessEqual(list(arr), range(10))
+        self.meta.update(w=numpy.zeros(1000, dtype=numpy.float64))
+        self.failUnlessEqual(list(arr), range(10))
+
 class AoiTestCase(unittest.TestCase):
     def setUp(self):
         self.failUnless(load_test_file("ir_bushehr_06jun02_ps.tif", True))
@@ -331,6 +485,14 @@ class AoiTestCase(unittest.TestCase):
         self.failUnlessEqual([aiter.next(), aiter.next(),
                               aiter.next(), aiter.next()],
                              [(1, 3), (2, 3), (1, 4), (2, 4)])
+        try:
+            import numpy
+        except ImportError:
+            return
+        mask = self.aoi.get_mask(10, 14, 13, 20)
+        self.failUnlessEqual(mask.shape, (7, 4))
+        self.failUnlessEqual(zip(*numpy.nonzero(mask)),
+                             [(1, 0), (1, 2), (6, 0), (6, 2)])
 
 class TempSliceObject(object):
     def __init__(self, dims):
@@ -365,6 +527,20 @@ class RasterTestCase(unittest.TestCase):
         self.failUnlessEqual(dinfo.encoding_size, 2)
         self.failUnlessEqual(dinfo.bad_values, [0])
 
+    def test_cached_info(self):
+        info = self.fetch_re.info
+        self.failUnless(self.fetch_re.info is info)
+        # the public DataInfo is a copy so changing it is allowed and
+        # does not affect data access
+        info.rows = 1
+        info.bad_values = [1, 2]
+        self.failUnlessEqual(self.fetch_re.data_info.bad_values, [1, 2])
+        self.failUnlessEqual(self.fetch_re.rows, 997)
+        self.failUnlessEqual(self.fetch_re.data_array[...].shape[0], 997)
+        self.fetch_re.invalidate_info()
+        self.failIf(self.fetch_re.info is info)
+        self.failUnlessEqual(self.fetch_re.info.rows, 997)
+
     def test_create_raster_element(self):
         interleave = opticks.Interleave.BSQ
         encoding = opticks.Encoding.INT1UBYTE
@@ -583,10 +759,337 @@ try:
             self.failUnlessEqual(data.shape, (997, 1000, 3))
             del data
 
+        def test_data_array_strided(self):
+            full = self.fetch_re.data_array[...].copy()
+            data = self.fetch_re.data_array[::4, 1::3, ::2]
+            self.failUnlessEqual(data.shape, (250, 333, 2))
+            self.failUnless(numpy.array_equal(data, full[::4, 1::3, ::2]))
+            self.failUnlessEqual(data.interleave.value,
+                                 opticks.Interleave.BIP)
+            self.failUnlessRaises(IndexError,
+                                  self.fetch_re.data_array.__getitem__,
+                                  slice(None, None, -1))
+
+        def test_data_array_strided_reads(self):
+            calls = []
+            def count_pointers(name, func):
+                if name != "createDataPointer":
+                    return func
+                def counted(*args):
+                    calls.append(args)
+                    return func(*args)
+                return counted
+            opticks._set_binding_hook(count_pointers)
+            try:
+                data = self.fetch_re.data_array[::4, ::4]
+            finally:
+                opticks._set_binding_hook(None)
+            self.failUnlessEqual(data.shape, (250, 250, 3))
+            # one data pointer per row which is read, not one per pixel
+            self.failUnlessEqual(len(calls), 250)
+            self.create_re = self.fetch_re.convert_interleave(
+                opticks.Interleave.BSQ, "strided")
+            del calls[:]
+            opticks._set_binding_hook(count_pointers)
+            try:
+                bsq = self.create_re.data_array[:, ::4, ::4]
+            finally:
+                opticks._set_binding_hook(None)
+            self.failUnless(numpy.array_equal(bsq, data.transpose(2, 0, 1)))
+            # only the rows which are needed are read from each band
+            self.failUnlessEqual(len(calls), 750)
+
+        def test_iter_tiles(self):
+            full = self.fetch_re.data_array[...].copy()
+            seen = numpy.zeros(full.shape[:2], dtype=int)
+            for window, block in self.fetch_re.iter_tiles(256, 300,
+                                                          bands=1,
+                                                          overlap=2):
+                rows = slice(window.row_start, window.row_end + 1)
+                cols = slice(window.column_start, window.column_end + 1)
+                self.failUnless(numpy.array_equal(block,
+                                                  full[rows, cols, 1:2]))
+                seen[rows, cols] += 1
+            self.failUnless(seen.min() >= 1)
+            tiles = [tile for tile, window in
+                     self.fetch_re.tile_windows(256, 300)]
+            self.failUnlessEqual(len(tiles), 16)
+
+        def test_map_tiles(self):
+            def double(block):
+                return block * 2.0
+            self.create_re = self.fetch_re.map_tiles(double, "mapped",
+                                                     workers=3,
+                                                     tile_rows=100,
+                                                     tile_cols=300)
+            self.failUnlessEqual(self.create_re.bands, 3)
+            self.failUnlessEqual(self.create_re.encoding.value,
+                                 opticks.Encoding.FLT8BYTES)
+            self.failUnless(numpy.array_equal(
+                    self.create_re.data_array[...],
+                    self.fetch_re.data_array[...] * 2.0))
+            stats = self.create_re.compute_statistics(bands=(0, 0))
+            self.failUnless(stats[0].histogram_counts is None)
+            self.failUnlessRaises(ValueError,
+                                  self.create_re.compute_statistics,
+                                  bands=(0, 0), bins=32)
+            band = self.create_re.data_array[...][:, :, 0].ravel()
+            stats = self.create_re.compute_statistics(bands=(0, 0), bins=32,
+                                                      hist_range=(0, 1e5))
+            self.failUnless(numpy.array_equal(
+                    stats[0].histogram_counts,
+                    numpy.histogram(band, 32, (0, 1e5))[0]))
+            # writing tiles discards the cached statistics
+            self.fetch_re.map_tiles(double, self.create_re, workers=2)
+            self.failIf(self.create_re.compute_statistics(
+                    bands=(0, 0), bins=32, hist_range=(0, 1e5)) is stats)
+
+        def test_process_tile(self):
+            import os
+            import shutil
+            import tempfile
+            import opticks_worker
+            def double(block):
+                return block * 2.0
+            def ignore(block):
+                return None
+            full = self.fetch_re.data_array[...].copy()
+            tile, window = list(self.fetch_re.tile_windows(100, 300,
+                                                           overlap=2))[5]
+            rows = slice(window.row_start, window.row_end + 1)
+            cols = slice(window.column_start, window.column_end + 1)
+            scratch = tempfile.mkdtemp()
+            try:
+                in_path = os.path.join(scratch, "in0")
+                out_path = os.path.join(scratch, "out0.npy")
+                shape = self.fetch_re._stage_tile(window, in_path)
+                staged = numpy.memmap(in_path, dtype=full.dtype, mode='r',
+                                      shape=shape)
+                self.failUnless(numpy.array_equal(staged, full[rows, cols]))
+                del staged
+                self.failIf(opticks_worker.process_tile(
+                        ignore, in_path, shape, full.dtype, out_path))
+                self.failIf(os.path.exists(out_path))
+                self.failUnless(opticks_worker.process_tile(
+                        double, in_path, shape, full.dtype, out_path))
+                target = ["processed"]
+                self.fetch_re._unstage_tile(target, tile, window, out_path)
+                self.create_re = target[0]
+            finally:
+                shutil.rmtree(scratch, True)
+            rows = slice(tile.row_start, tile.row_end + 1)
+            cols = slice(tile.column_start, tile.column_end + 1)
+            self.failUnless(numpy.array_equal(
+                    self.create_re.data_array[...][rows, cols],
+                    full[rows, cols] * 2.0))
+
+        def test_compute_statistics(self):
+            full = self.fetch_re.data_array[...].copy()
+            stats = self.fetch_re.compute_statistics(bands=(1, 2), bins=64,
+                                                     workers=2,
+                                                     tile_rows=100)
+            self.failUnlessEqual([stat.band for stat in stats], [1, 2])
+            band = full[:, :, 2].ravel().astype(numpy.float64)
+            self.failUnlessEqual(stats[1].count, band.size)
+            self.failUnlessEqual((stats[1].min, stats[1].max),
+                                 (band.min(), band.max()))
+            self.failUnlessAlmostEqual(stats[1].mean, band.mean(), 6)
+            self.failUnlessAlmostEqual(stats[1].std_dev, band.std(), 6)
+            counts, edges = numpy.histogram(band, 64,
+                                            (band.min(), band.max()))
+            self.failUnless(numpy.array_equal(stats[1].histogram_counts,
+                                              counts))
+            self.failUnless(self.fetch_re.compute_statistics(
+                    bands=(1, 2), bins=64) is stats)
+            self.fetch_re.data_array[0, 0] = numpy.zeros(3, full.dtype)
+            self.failIf(self.fetch_re.compute_statistics(
+                    bands=(1, 2), bins=64) is stats)
+            # the cache is shared by every wrapper of the element
+            stats = self.fetch_re.compute_statistics(bands=(1, 2), bins=64)
+            other = opticks.RasterElement("ir_bushehr_06jun02_ps.tif")
+            self.failUnless(other.compute_statistics(
+                    bands=(1, 2), bins=64) is stats)
+            acc = other.get_data_accessor(opticks.Interleave.BIP, write=True)
+            acc.scatter([1], [1], 0)
+            self.failIf(self.fetch_re.compute_statistics(
+                    bands=(1, 2), bins=64) is stats)
+
+        def test_bandmath(self):
+            full = self.fetch_re.data_array[...].astype(numpy.float32)
+            self.create_re = opticks.bandmath("(b[2] - b[0]) / (b[2] + b[0])",
+                                              self.fetch_re, "ratio",
+                                              workers=2, tile_rows=100)
+            self.failUnlessEqual(self.create_re.bands, 1)
+            self.failUnlessEqual(self.create_re.encoding.value,
+                                 opticks.Encoding.FLT4BYTES)
+            expected = (full[:, :, 2] - full[:, :, 0]) / \
+                       (full[:, :, 2] + full[:, :, 0])
+            self.failUnless(numpy.allclose(self.create_re.data_array[0],
+                                           expected))
+            self.failUnlessRaises(ValueError, opticks.bandmath,
+                                  "b[0] + __import__('os')", self.fetch_re)
+            self.failUnlessRaises(IndexError, opticks.bandmath,
+                                  "b[3]", self.fetch_re)
+
+        def test_spectral_covariance(self):
+            full = self.fetch_re.data_array[...].astype(numpy.float64)
+            mean, covariance = self.fetch_re.spectral_covariance(
+                tile_rows=100)
+            pixels = full.reshape(-1, 3)
+            self.failUnless(numpy.allclose(mean, pixels.mean(axis=0)))
+            self.failUnless(numpy.allclose(covariance, numpy.cov(pixels.T)))
+            mean, covariance = self.fetch_re.spectral_covariance(
+                step=4, bands=(1, 2), workers=2)
+            pixels = full[::4, ::4, 1:].reshape(-1, 2)
+            self.failUnless(numpy.allclose(covariance, numpy.cov(pixels.T)))
+
+        def test_signature_match(self):
+            saved = self.fetch_re.data_array[0, 0].copy()
+            self.fetch_re.data_array[0, 0] = numpy.zeros(3, numpy.uint16)
+            try:
+                self.__check_signature_match()
+            finally:
+                self.fetch_re.data_array[0, 0] = saved
+
+        def __check_signature_match(self):
+            full = self.fetch_re.data_array[...].astype(numpy.float64)
+            target = full[10, 20]
+            pixels = full.reshape(-1, 3)
+            # pixels with a bad value in any band score NaN
+            bad = (pixels == 0).any(axis=1)
+            sig = opticks.Signature.create("Match Signature")
+            try:
+                sig["Reflectance"] = opticks.DataVariant(
+                    ", ".join([repr(value) for value in target]),
+                    "vector<double>")
+                self.failUnless(numpy.array_equal(sig.spectrum(), target))
+                self.create_re = sig.match(self.fetch_re, "sam", "angles",
+                                           workers=2, tile_rows=100)
+                self.failUnlessEqual(self.create_re.bands, 1)
+                angles = self.create_re.data_array[..., 0]
+                self.failUnlessAlmostEqual(angles[10, 20], 0.0, 3)
+                expected = numpy.arccos(numpy.clip(
+                        numpy.dot(pixels, target) /
+                        numpy.sqrt((pixels ** 2).sum(axis=1)) /
+                        numpy.sqrt((target ** 2).sum()), -1, 1))
+                self.failUnless(numpy.isnan(angles.ravel()[bad]).all())
+                self.failUnless(numpy.allclose(angles.ravel()[~bad],
+                                               expected[~bad], atol=1e-4))
+                self.create_re.destroy()
+                self.create_re = None
+                mean = pixels[~bad].mean(axis=0)
+                covariance = numpy.cov(pixels[~bad], rowvar=0)
+                inverse = numpy.linalg.pinv(covariance)
+                offsets = pixels - mean
+                projected = numpy.dot(offsets, numpy.dot(inverse,
+                                                         target - mean))
+                energy = numpy.dot(target - mean,
+                                   numpy.dot(inverse, target - mean))
+                expected = {"mf":projected / energy,
+                            "ace":projected ** 2 / energy /
+                            (numpy.dot(offsets, inverse) * offsets).sum(axis=1)}
+                for method in ("mf", "ace"):
+                    self.create_re = sig.match(self.fetch_re, method,
+                                               background=(mean, covariance),
+                                               workers=2, tile_rows=100)
+                    scores = self.create_re.data_array[..., 0].ravel()
+                    self.failUnless(numpy.isnan(scores[bad]).all())
+                    self.failUnless(numpy.allclose(scores[~bad],
+                                                   expected[method][~bad],
+                                                   rtol=1e-4, atol=1e-5))
+                    self.create_re.destroy()
+                    self.create_re = None
+                self.failUnlessRaises(ValueError, sig.match, self.fetch_re,
+                                      "sam", bands=(0, 1))
+            finally:
+                sig.destroy()
+
+        def test_gather_scatter(self):
+            full = self.fetch_re.data_array[...].copy()
+            rows = numpy.array([500, 3, 500, 996, 3])
+            cols = numpy.array([7, 999, 0, 12, 4])
+            acc = self.fetch_re.get_data_accessor()
+            self.failUnless(numpy.array_equal(acc.gather(rows, cols),
+                                              full[rows, cols]))
+            acc = self.fetch_re.get_data_accessor(opticks.Interleave.BSQ,
+                                                  brow=2, erow=600,
+                                                  bcol=4, ecol=10,
+                                                  bband=1, eband=1)
+            self.failUnless(numpy.array_equal(acc.gather([3, 500], [4, 7]),
+                                              full[[3, 500], [4, 7], 1]))
+            self.failUnlessRaises(opticks.OpticksError, acc.gather,
+                                  [3], [11])
+            acc = self.fetch_re.get_data_accessor(opticks.Interleave.BSQ,
+                                                  bband=0, eband=2)
+            self.failUnlessRaises(opticks.OpticksError, acc.gather,
+                                  [3], [4])
+            acc = self.fetch_re.get_data_accessor(opticks.Interleave.BIP,
+                                                  write=True)
+            acc.scatter(rows[:2], cols[:2], [[1, 2, 3], [4, 5, 6]])
+            self.fetch_re.update()
+            self.failUnlessEqual(list(self.fetch_re.data_array[500, 7]),
+                                 [1, 2, 3])
+            self.failUnlessEqual(list(self.fetch_re.data_array[3, 999]),
+                                 [4, 5, 6])
+
+        def test_row_views(self):
+            full = self.fetch_re.data_array[...].copy()
+            acc = self.fetch_re.get_data_accessor(opticks.Interleave.BIP,
+                                                  brow=5, erow=14,
+                                                  bcol=10, ecol=19)
+            # each view is only valid until the accessor moves on
+            rows = [row.copy() for row in acc.iter_rows(as_numpy=True)]
+            self.failUnlessEqual(len(rows), 10)
+            self.failUnless(numpy.array_equal(numpy.array(rows),
+                                              full[5:15, 10:20]))
+            acc = self.fetch_re.get_data_accessor(opticks.Interleave.BIP)
+            self.failIf(acc.iter_rows(as_numpy=True).next().flags.writeable)
+            acc = self.fetch_re.get_data_accessor(opticks.Interleave.BIL,
+                                                  brow=5, erow=14, crows=4)
+            starts = []
+            for row, block in acc.iter_row_blocks():
+                starts.append(row)
+                expected = full[row:row + len(block)].transpose(0, 2, 1)
+                self.failUnless(numpy.array_equal(block, expected))
+            self.failUnlessEqual(starts, [5, 9, 13])
+            acc = self.fetch_re.get_data_accessor(opticks.Interleave.BIP,
+                                                  brow=5, erow=14,
+                                                  crows=4, write=True)
+            for row, block in acc.iter_row_blocks():
+                block[:] = 7
+            self.fetch_re.update()
+            self.failUnless((self.fetch_re.data_array[5:15] == 7).all())
+
+        def test_convert_interleave(self):
+            full = self.fetch_re.data_array[...].copy()
+            out = numpy.zeros((2, 997, 1000), dtype=full.dtype)
+            result = self.fetch_re.convert_interleave(opticks.Interleave.BSQ,
+                                                      out, bands=(1, 2),
+                                                      tile_rows=300,
+                                                      tile_cols=70,
+                                                      band_chunk=1)
+            self.failUnless(result is out)
+            self.failUnless(numpy.array_equal(
+                    out, full[:, :, 1:].transpose(2, 0, 1)))
+            self.create_re = self.fetch_re.convert_interleave(
+                opticks.Interleave.BIL, "converted", tile_rows=100)
+            self.failUnlessEqual(self.create_re.interleave.value,
+                                 opticks.Interleave.BIL)
+            self.failUnless(numpy.array_equal(self.create_re.data_array[...],
+                                              full.transpose(0, 2, 1)))
+            self.failUnlessRaises(ValueError,
+                                  self.fetch_re.convert_interleave,
+                                  opticks.Interleave.BIP, out)
+            window, block = self.fetch_re.iter_tiles(
+                10, 20, interleave=opticks.Interleave.BSQ).next()
+            self.failUnlessEqual(block.shape, (3, 10, 20))
+            self.failUnless(numpy.array_equal(
+                    block, full[:10, :20].transpose(2, 0, 1)))
+
         def test_data_array_bad_writes(self):
             self.failUnless(self.fetch_re)
             org_data = self.fetch_re.data_array[1]
-            fake_data = numpy.arange(org_data.size)
+            fake_data = numpy.array(["x"] * org_data.size)
             del org_data
             try:
                 self.fetch_re.data_array[1] = fake_data
@@ -669,6 +1172,24 @@ try:
             self.failUnless(numpy.array_equal(expected_data, new_data))
             del new_data
 
+        def test_data_array_write_converted(self):
+            full = self.fetch_re.data_array[...].copy()
+            # float, non-contiguous data is converted while it is written
+            bands = numpy.arange(200 * 3, dtype=numpy.float64)
+            bands = bands.reshape(3, 200).T[::-1]
+            self.fetch_re.data_array[10, 300:500] = bands
+            full[10, 300:500] = bands
+            old_chunk = opticks._WRITE_CHUNK_BYTES
+            opticks._WRITE_CHUNK_BYTES = 1000
+            try:
+                data = numpy.asfortranarray(full[50:80, 20:90] + 1)
+                self.fetch_re.data_array[50:80, 20:90] = data
+                full[50:80, 20:90] = data
+            finally:
+                opticks._WRITE_CHUNK_BYTES = old_chunk
+            self.failUnless(numpy.array_equal(self.fetch_re.data_array[...],
+                                              full))
+
         def test_create_raster2d(self):
             temp = numpy.arange(10, dtype="uint16")
             temp.shape = (5, 2)
@@ -743,6 +1264,80 @@ try:
             relem.destroy()
             del relem
 
+        def test_create_from_file(self):
+            import tempfile
+            import shutil
+            import os.path
+            full = self.fetch_re.data_array[:100, :50].copy()
+            scratch = tempfile.mkdtemp()
+            try:
+                path = os.path.join(scratch, "cube.img")
+                bil = full.transpose(0, 2, 1).astype(">u2")
+                data = open(path, "wb")
+                data.write("x" * 16 + bil.tostring())
+                data.close()
+                hdr = open(os.path.join(scratch, "cube.hdr"), "w")
+                hdr.write("ENVI\ndescription = {test\n cube}\n"
+                          "samples = 50\nlines = 100\nbands = 3\n"
+                          "header offset = 16\ndata type = 12\n"
+                          "interleave = bil\nbyte order = 1\n")
+                hdr.close()
+                relem = opticks.RasterElement.create_from_file("envi", path)
+                self.failUnlessEqual(relem.interleave.value,
+                                     opticks.Interleave.BIL)
+                self.failUnless(numpy.array_equal(relem.data_array[...],
+                                                  bil))
+                relem.destroy()
+                del relem
+
+                relem = opticks.RasterElement.create_from_file(
+                    "raw", path, (3, 100, 50), ">u2", opticks.Interleave.BSQ,
+                    16, opticks.ProcessingLocationPreference.RAM)
+                self.failUnlessEqual((relem.rows, relem.columns, relem.bands),
+                                     (100, 50, 3))
+                relem.destroy()
+                del relem
+
+                path = os.path.join(scratch, "band.npy")
+                numpy.save(path, full[:, :, 2])
+                relem = opticks.RasterElement.create_from_file("npy", path)
+                self.failUnlessEqual(relem.bands, 1)
+                self.failUnless(numpy.array_equal(relem.data_array[0],
+                                                  full[:, :, 2]))
+                relem.destroy()
+                del relem
+                self.failUnlessRaises(ValueError,
+                                      opticks.RasterElement.create_from_file,
+                                      "bad", os.path.join(scratch, "none"))
+            finally:
+                shutil.rmtree(scratch, True)
+
+        def test_export(self):
+            import tempfile
+            import shutil
+            import os.path
+            full = self.fetch_re.data_array[...].copy()
+            scratch = tempfile.mkdtemp()
+            try:
+                path = os.path.join(scratch, "cube.npy")
+                self.fetch_re.export(path, opticks.Interleave.BSQ,
+                                     bands=(1, 2), tile_rows=300)
+                self.failUnless(numpy.array_equal(
+                        numpy.load(path), full[:, :, 1:].transpose(2, 0, 1)))
+                path = os.path.join(scratch, "cube.img")
+                self.fetch_re.export(path, opticks.Interleave.BIL)
+                self.failUnless(os.path.isfile(os.path.join(scratch,
+                                                            "cube.hdr")))
+                self.create_re = opticks.RasterElement.create_from_file(
+                    "exported", path)
+                self.failUnlessEqual(self.create_re.interleave.value,
+                                     opticks.Interleave.BIL)
+                self.failUnless(numpy.array_equal(
+                        self.create_re.data_array[...],
+                        full.transpose(0, 2, 1)))
+            finally:
+                shutil.rmtree(scratch, True)
+
 except ImportError:
     class RasterNumpyTestCase(unittest.TestCase):
         #pylint: disable=R0201
@@ -0,0 +1,33 @@
+"""Worker process side of opticks.RasterElement.map_tiles_processes().
+
+This module must not import opticks. Worker processes which are started
+instead of forked (always the case on Windows) import the module of the
+function they run, and opticks can only be imported inside Opticks.
+
+"""
+
+__copyright__ = """The information in this file is
+ Copyright(c) 2009 Ball Aerospace & Technologies Corporation
+ and is subject to the terms and conditions of the
+ GNU Lesser General Public License Version 2.1
+ The license text is available from
+ http://www.gnu.org/licenses/lgpl.html"""
+
+def process_tile(func, in_path, shape, dtype, out_path):
+    """Call func on the tile memory mapped from in_path and store the
+    result in the .npy file out_path. Returns False if func returned None.
+
+    """
+    import numpy
+    block = numpy.memmap(in_path, dtype=dtype, mode='r', shape=shape)
+    result = func(block)
+    del block
+    if result is None:
+        return False
+    result = numpy.asarray(result)
+    out = numpy.lib.format.open_memmap(out_path, mode='w+',
+                                       dtype=result.dtype, shape=result.shape)
+    out[...] = result
+    out.flush()
+    del out
+    return True